@@ -0,0 +1,260 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from random import uniform, seed
+from statistics import median
+from connection import close_connections, get_connection
+from cache import QUERY_CACHE
+from core import (
+    calculate_usage, calculate_production, adjust_for_packaging,
+    get_data_for_new_list, get_average_usage_by_product, get_old_list, insert_production_data,
+    get_service_days, iterate_history
+)
+from dummydatagenerator import generate_scenario
+
+# Products x days of history
+SCALES = ((100, 30), (100, 365), (100, 1095),
+          (1000, 30), (1000, 365), (1000, 1095),
+          (10000, 30), (10000, 365), (10000, 1095))
+# Times slower than the baseline before a result counts as a regression
+REGRESSION_THRESHOLD = 0.25
+# Results faster than this are too noisy to compare, in seconds
+MINIMUM_TIME = 0.001
+FIXTURE_SEED = 1
+FIXTURE_END_DATE = date(2024, 1, 1)
+
+
+def scale_name(products: int, days: int) -> str:
+    """
+    Returns the name of a scale, used as the key in results and as the fixture directory
+    """
+    return f"{products}x{days}"
+
+
+def parse_scale(text: str) -> tuple:
+    """
+    Parses a scale written as PRODUCTSxDAYS, i.e. 1000x365
+    """
+    products, days = text.lower().split("x")
+    return int(products), int(days)
+
+
+def get_fixture(directory: str, products: int, days: int) -> str:
+    """
+    Returns the path of a synthetic database for the scale, generating it on first use.
+    Fixtures are seeded, so a kept fixture always holds the same data
+    """
+    path = os.path.join(directory, scale_name(products, days), "store_1.db")
+    if not os.path.exists(path):
+        generate_scenario(os.path.dirname(path), products, days, 1, FIXTURE_SEED, FIXTURE_END_DATE)
+    return path
+
+
+def time_call(function, *args) -> float:
+    """
+    Returns the seconds a single call takes
+    """
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def time_operation(function, args: tuple, repeats: int) -> dict:
+    """
+    Times a DB OPS function cold, on fresh connections, and warm, on connections with
+    their statement and page caches filled. The query cache is emptied before every call,
+    otherwise warm calls would only measure a cache lookup
+    """
+    close_connections()
+    QUERY_CACHE.clear()
+    cold = time_call(function, *args)
+
+    warm = []
+    for n in range(repeats):
+        QUERY_CACHE.clear()
+        warm.append(time_call(function, *args))
+
+    return {"cold": cold, "warm": median(warm)}
+
+
+def time_inserts(conn_string: str, products: int, repeats: int) -> dict:
+    """
+    Times inserting a completed list for every product, each repeat being the next day
+    """
+    def production_list(day: int) -> list:
+        list_date = FIXTURE_END_DATE + timedelta(days=day)
+        return [(id, list_date, 1.0, 0.5, 2.0) for id in range(1, products + 1)]
+
+    close_connections()
+    cold = time_call(insert_production_data, conn_string, production_list(0))
+    warm = [time_call(insert_production_data, conn_string, production_list(n + 1)) for n in range(repeats)]
+
+    return {"cold": cold, "warm": median(warm)}
+
+
+def time_calculations(products: int, days: int, repeats: int) -> dict:
+    """
+    Times the CALCULATIONS functions over the history of every product,
+    the way a new list calculates them
+    """
+    seed(FIXTURE_SEED)
+    history = [([uniform(0, 5) for n in range(days)], [uniform(0, 1) for n in range(days)],
+                [uniform(0, 10) for n in range(days)]) for n in range(products)]
+
+    def calculate_all() -> None:
+        for remaining, discarded, produced in history:
+            usage = calculate_usage(remaining, discarded, produced)
+            production = calculate_production(remaining[-1], usage)
+            adjust_for_packaging(production, False, 6)
+
+    results = [time_call(calculate_all) for n in range(repeats + 1)]
+    return {"cold": results[0], "warm": median(results[1:])}
+
+
+def measure_history_memory(conn_string: str, days: int) -> dict:
+    """
+    Measures the peak memory, in MiB, of reading the last N days of history
+    all at once with fetchall and streamed product by product with iterate_history
+    """
+    start_date = get_service_days(conn_string, days)[-1]
+
+    tracemalloc.start()
+    rows = get_connection(conn_string).execute("""
+        SELECT ProductID, Date, Remaining, Discarded, Produced
+        FROM ProductionData WHERE Date >= (?)
+    """, (start_date,)).fetchall()
+    fetchall_peak = tracemalloc.get_traced_memory()[1]
+    del rows
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    for product_id, entries in iterate_history(conn_string, start_date):
+        pass
+    streamed_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {"fetchall": fetchall_peak / 2 ** 20, "streamed": streamed_peak / 2 ** 20}
+
+
+def run_scale(directory: str, products: int, days: int, repeats: int) -> dict:
+    """
+    Runs every benchmark for one scale and returns the timings keyed by operation
+    """
+    fixture = get_fixture(directory, products, days)
+    with sqlite3.connect(fixture) as conn:
+        last_date = conn.execute("SELECT MAX(Date) FROM ProductionData").fetchone()[0]
+
+    results = {}
+    for window in (7, 30):
+        results[f"get_data_for_new_list_{window}"] = time_operation(get_data_for_new_list, (fixture, window), repeats)
+    results["get_average_usage_by_product_30"] = time_operation(get_average_usage_by_product, (fixture, 30), repeats)
+    results["get_old_list"] = time_operation(get_old_list, (fixture, last_date), repeats)
+    results["history_memory_mb"] = measure_history_memory(fixture, days)
+
+    # Inserts change the database, so they run on a copy
+    copy = os.path.join(directory, scale_name(products, days), "insert_copy.db")
+    shutil.copyfile(fixture, copy)
+    try:
+        results["insert_production_data"] = time_inserts(copy, products, repeats)
+    finally:
+        close_connections()
+        os.remove(copy)
+
+    results["calculations"] = time_calculations(products, days, repeats)
+    return results
+
+
+def run_benchmarks(directory: str, scales: tuple = SCALES, repeats: int = 5, progress = None) -> dict:
+    """
+    Runs the benchmarks at every scale, generating missing fixtures in the directory.
+    Returns the timings along with the environment they were measured in
+    """
+    results = {
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "machine": platform.machine(),
+            "date": date.today().isoformat(),
+        },
+        "scales": {},
+    }
+    for products, days in scales:
+        results["scales"][scale_name(products, days)] = run_scale(directory, products, days, repeats)
+        if progress is not None:
+            progress(scale_name(products, days), results["scales"][scale_name(products, days)])
+    return results
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD) -> list:
+    """
+    Compares results with a baseline. Returns tuples of (scale, operation, timing, baseline seconds, seconds)
+    for every timing more than the threshold slower than its baseline.
+    Scales or operations missing from either side are skipped
+    """
+    regressions = []
+    for scale, operations in results["scales"].items():
+        for operation, timings in operations.items():
+            baseline_timings = baseline.get("scales", {}).get(scale, {}).get(operation, {})
+            for timing, seconds in timings.items():
+                baseline_seconds = baseline_timings.get(timing)
+                if baseline_seconds is None or max(seconds, baseline_seconds) < MINIMUM_TIME:
+                    continue
+                if seconds > baseline_seconds * (1 + threshold):
+                    regressions.append((scale, operation, timing, baseline_seconds, seconds))
+    return regressions
+
+
+def print_scale(scale: str, results: dict) -> None:
+    """
+    Prints the timings of one scale in milliseconds and the memory measurements in MiB
+    """
+    print(scale)
+    for operation, timings in results.items():
+        if operation.endswith("_mb"):
+            print(f"  {operation:<28} " + "  ".join(f"{name} {value:>10.2f} MiB" for name, value in timings.items()))
+        else:
+            print(f"  {operation:<28} cold {timings['cold'] * 1000:>10.2f} ms  warm {timings['warm'] * 1000:>10.2f} ms")
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the database operations and calculations")
+    parser.add_argument("--scales", nargs="+", type=parse_scale,
+                        default=list(SCALES), help="scales to run as PRODUCTSxDAYS, i.e. 1000x365")
+    parser.add_argument("--fixtures", default="benchmark_fixtures", help="directory for the generated databases")
+    parser.add_argument("--repeats", type=int, default=5, help="number of warm runs per operation")
+    parser.add_argument("--output", default="benchmark_results.json", help="file to write the results to")
+    parser.add_argument("--baseline", help="results file to check for regressions against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="fraction a timing may be slower than the baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results to the baseline file")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.fixtures, args.scales, args.repeats, print_scale)
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+
+    if args.baseline is None:
+        return 0
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    with open(args.baseline) as file:
+        regressions = find_regressions(results, json.load(file), args.threshold)
+    for scale, operation, timing, baseline_seconds, seconds in regressions:
+        print(f"regression: {scale} {operation} {timing} {baseline_seconds * 1000:.2f} ms -> {seconds * 1000:.2f} ms",
+              file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
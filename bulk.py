@@ -0,0 +1,145 @@
+import csv
+import sqlite3
+import time
+from datetime import date
+from connection import get_connection
+from cache import mark_changed
+from migrations import USAGE_TOTALS_BACKFILL, SERVICE_DAYS_BACKFILL
+
+# Number of rows read, written or fetched at a time
+CHUNK_SIZE = 50000
+EXPORT_HEADERS = ("ProductID", "Name", "Date", "Remaining", "Discarded", "Produced")
+
+
+def drop_production_indexes(conn: sqlite3.Connection) -> list:
+    """
+    Drops the ProductionData indexes so rows can be loaded without maintaining them.
+    Returns the names and definitions needed to restore them
+    """
+    indexes = conn.execute("""
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'index' AND tbl_name = 'ProductionData' AND sql IS NOT NULL
+    """).fetchall()
+    for name, sql in indexes:
+        conn.execute(f'DROP INDEX "{name}"')
+    return indexes
+
+
+def restore_production_indexes(conn: sqlite3.Connection, indexes: list) -> None:
+    """
+    Recreates the dropped ProductionData indexes and rebuilds the running usage totals
+    and the service days from the loaded history
+    """
+    for name, sql in indexes:
+        conn.execute(sql)
+    conn.execute("DELETE FROM UsageTotals")
+    conn.execute(USAGE_TOTALS_BACKFILL)
+    conn.execute(SERVICE_DAYS_BACKFILL)
+
+
+def read_chunks(file, chunk_size: int = CHUNK_SIZE):
+    """
+    Reads ProductionData rows from a CSV file with a header row and yields them in chunks
+    of (ProductID, Date, Remaining, Discarded, Produced) tuples. Other columns, like the
+    product name in an export, are ignored. Dates must be ISO dates (YYYY-MM-DD) and are
+    stored in that form, since the usage windows depend on them sorting as text
+    """
+    reader = csv.reader(file)
+    header = next(reader)
+    try:
+        columns = [header.index(name) for name in ("ProductID", "Date", "Remaining", "Discarded", "Produced")]
+    except ValueError as error:
+        raise ValueError(f"Missing column in header: {error}")
+
+    chunk = []
+    for row in reader:
+        try:
+            chunk.append((int(row[columns[0]]), date.fromisoformat(row[columns[1]]).isoformat(),
+                          float(row[columns[2]]), float(row[columns[3]]), float(row[columns[4]])))
+        except (ValueError, IndexError) as error:
+            raise ValueError(f"Invalid row on line {reader.line_num}: {error}")
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_production_data(conn_string: str, path: str, chunk_size: int = CHUNK_SIZE,
+                           progress = None) -> tuple:
+    """
+    Streams ProductionData history from a CSV file into the database in a single transaction.
+    The ProductionData indexes are dropped while loading and rebuilt afterwards,
+    together with the running usage totals. If anything fails nothing is imported.
+    The optional progress callback receives the rows imported so far and the elapsed seconds.
+    Returns the number of rows, the elapsed seconds and the rows per second
+    """
+    start = time.perf_counter()
+    rows = 0
+    conn = get_connection(conn_string)
+
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        indexes = drop_production_indexes(conn)
+
+        with open(path, newline="") as file:
+            for chunk in read_chunks(file, chunk_size):
+                conn.executemany("""
+                    INSERT INTO ProductionData
+                    (ProductID, Date, Remaining, Discarded, Produced)
+                    VALUES (?, ?, ?, ?, ?)
+                """, chunk)
+                rows += len(chunk)
+                if progress is not None:
+                    progress(rows, time.perf_counter() - start)
+
+        restore_production_indexes(conn, indexes)
+        conn.commit()
+    except sqlite3.OperationalError as error:
+        conn.rollback()
+        raise Exception(error)
+    except BaseException:
+        conn.rollback()
+        raise
+
+    mark_changed(conn_string)
+    elapsed = time.perf_counter() - start
+    return rows, elapsed, rows / elapsed if elapsed > 0 else 0.0
+
+
+def export_production_data(conn_string: str, path: str, chunk_size: int = CHUNK_SIZE,
+                           progress = None) -> tuple:
+    """
+    Streams the ProductionData history joined with the product names to a CSV file,
+    fetching a chunk of rows at a time so memory use stays constant.
+    The optional progress callback receives the rows exported so far and the elapsed seconds.
+    Returns the number of rows, the elapsed seconds and the rows per second
+    """
+    start = time.perf_counter()
+    rows = 0
+
+    try:
+        with get_connection(conn_string) as conn, open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(EXPORT_HEADERS)
+            result = conn.cursor().execute("""
+                SELECT ProductionData.ProductID, Products.Name, ProductionData.Date,
+                ProductionData.Remaining, ProductionData.Discarded, ProductionData.Produced
+                FROM ProductionData
+                JOIN Products
+                ON Products.ID = ProductionData.ProductID
+                ORDER BY ProductionData.Date ASC, ProductionData.ProductID ASC
+            """)
+            while True:
+                chunk = result.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                writer.writerows(chunk)
+                rows += len(chunk)
+                if progress is not None:
+                    progress(rows, time.perf_counter() - start)
+    except sqlite3.OperationalError as error:
+        raise Exception(error)
+
+    elapsed = time.perf_counter() - start
+    return rows, elapsed, rows / elapsed if elapsed > 0 else 0.0
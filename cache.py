@@ -0,0 +1,135 @@
+import threading
+from collections import OrderedDict
+from functools import wraps
+from connection import get_data_version
+
+# Maximum number of query results kept in the cache
+MAX_ENTRIES = 64
+# Product instructions kept in their cache and the total characters they may hold
+MAX_INSTRUCTIONS = 256
+MAX_INSTRUCTIONS_SIZE = 8 * 2 ** 20
+
+
+class QueryCache():
+    """
+    Keeps the results of read queries until the database they came from changes.
+    A database counts as changed when one of the DB OPS write functions marks it,
+    or when any connection (thread or process) commits to it, which SQLite
+    reports through PRAGMA data_version on the connection manager's watcher.
+    With a sizeof function the least recently used results are also dropped once their total size
+    goes over max_size
+    """
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_size: int = None, sizeof = None) -> None:
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.size = 0
+        self.entries = OrderedDict()
+        self.write_counts = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+
+    def version(self, conn_string: str) -> tuple:
+        """
+        Returns a token that changes whenever the database may have changed.
+        It is the same for every thread, so a result cached on one thread is reused by the others
+        """
+        return (self.write_counts.get(conn_string, 0), get_data_version(conn_string))
+
+
+    def get(self, conn_string: str, key: tuple, loader) -> object:
+        """
+        Returns the cached result for the key if the database hasn't changed since it was stored,
+        otherwise calls the loader and caches its result
+        """
+        version = self.version(conn_string)
+        with self.lock:
+            entry = self.entries.get((conn_string, key))
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end((conn_string, key))
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        result = loader()
+        size = self.sizeof(result) if self.sizeof is not None else 0
+
+        with self.lock:
+            old = self.entries.pop((conn_string, key), None)
+            if old is not None:
+                self.size -= old[2]
+            self.entries[(conn_string, key)] = (version, result, size)
+            self.size += size
+            while len(self.entries) > self.max_entries or (
+                    self.max_size is not None and self.size > self.max_size and len(self.entries) > 1):
+                self.size -= self.entries.popitem(last=False)[1][2]
+        return result
+
+
+    def mark_changed(self, conn_string: str) -> None:
+        """
+        Records a write to the database, invalidating everything cached for it
+        """
+        with self.lock:
+            self.write_counts[conn_string] = self.write_counts.get(conn_string, 0) + 1
+
+
+    def clear(self) -> None:
+        """
+        Drops all cached results and resets the statistics
+        """
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+
+    def stats(self) -> dict:
+        """
+        Returns the hit and miss counts along with the number and total size of cached results
+        """
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self.entries),
+                "size": self.size,
+            }
+
+
+QUERY_CACHE = QueryCache()
+INSTRUCTIONS_CACHE = QueryCache(MAX_INSTRUCTIONS, MAX_INSTRUCTIONS_SIZE, lambda text: len(text or ""))
+
+
+def cached_query(function):
+    """
+    Caches the result of a DB OPS read function taking a connection string
+    followed by hashable arguments, such as the number of days
+    """
+    @wraps(function)
+    def wrapper(conn_string: str, *args) -> list:
+        result = QUERY_CACHE.get(conn_string, (function.__name__,) + args,
+                                 lambda: function(conn_string, *args))
+        # Callers get their own list so they can't change the cached one
+        return list(result)
+    return wrapper
+
+
+def mark_changed(conn_string: str) -> None:
+    """
+    Invalidates the cached queries and instructions of a database after a write
+    """
+    QUERY_CACHE.mark_changed(conn_string)
+    INSTRUCTIONS_CACHE.mark_changed(conn_string)
+
+
+def get_cache_stats() -> dict:
+    """
+    Returns the query cache hit and miss statistics
+    """
+    return QUERY_CACHE.stats()
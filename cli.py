@@ -0,0 +1,232 @@
+import argparse
+import csv
+import os
+import sys
+from datetime import date
+from migrations import check_schema, migrate
+from core import (
+    CONNECTION_STRING,
+    ProductionList,
+    calculate_production, adjust_for_packaging,
+    get_data_for_new_list, insert_production_data
+)
+from bulk import import_production_data, export_production_data
+from tracing import SLOW_QUERY_THRESHOLD, enable_tracing, disable_tracing, format_query_stats
+
+PLAN_HEADERS = ("ProductID", "Name", "Remaining", "Discarded", "Produced", "Average")
+
+
+def positive_int(value: str) -> int:
+    """
+    Parses a number of days, which has to be at least one
+    """
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive number, got {number}")
+    return number
+
+
+def build_plan(conn_string: str, days: int) -> ProductionList:
+    """
+    Generates a new production list over an N-day window, the same way the START NEW LIST button does
+    """
+    plan = ProductionList()
+    plan.load_new(get_data_for_new_list(conn_string, days))
+    return plan
+
+
+def read_counts(path: str) -> dict:
+    """
+    Reads the actual counts from a CSV file with a ProductID, Remaining and Discarded column
+    and an optional Produced column. Returns a dictionary keyed by product ID
+    """
+    counts = {}
+    with open(path, newline="") as file:
+        for row in csv.DictReader(file):
+            produced = row.get("Produced")
+            counts[int(row["ProductID"])] = (
+                float(row["Remaining"]),
+                float(row["Discarded"]),
+                float(produced) if produced not in (None, "") else None,
+            )
+    return counts
+
+
+def complete_plan(plan: ProductionList, counts: dict) -> None:
+    """
+    Fills the counts into the plan. Production numbers that weren't counted
+    are recalculated from the remaining portions, like editing "remaining" in the list
+    """
+    missing = [model.name for model in plan if model.id not in counts]
+    if missing:
+        raise ValueError(f"No counts for: {', '.join(missing)}")
+    unknown = [id for id in counts if plan.row_of(id) is None]
+    if unknown:
+        raise ValueError(f"Unknown product IDs: {', '.join(str(id) for id in sorted(unknown))}")
+
+    for model in plan:
+        remaining, discarded, produced = counts[model.id]
+        model.remaining = remaining
+        model.discarded = discarded
+        if produced is None:
+            produced = calculate_production(remaining, model.average)
+            produced = adjust_for_packaging(produced, model.can_portion_partially, model.portions_from_package)
+        model.produced = produced
+        model.completed = True
+
+
+def write_plan(plan: ProductionList, file) -> None:
+    """
+    Writes the plan to a file object as CSV
+    """
+    writer = csv.writer(file)
+    writer.writerow(PLAN_HEADERS)
+    for model in plan:
+        writer.writerow((model.id, model.name, model.remaining, model.discarded, model.produced, model.average))
+
+
+def print_plan(plan: ProductionList) -> None:
+    """
+    Prints the plan as a table
+    """
+    width = max([len(model.name) for model in plan] + [len(PLAN_HEADERS[1])])
+    print(f"{PLAN_HEADERS[0]:>9}  {PLAN_HEADERS[1]:<{width}}  "
+          + "  ".join(f"{header:>9}" for header in PLAN_HEADERS[2:]))
+    for model in plan:
+        print(f"{model.id:>9}  {model.name:<{width}}  {model.remaining:>9.1f}  {model.discarded:>9.1f}  "
+              f"{model.produced:>9.1f}  {model.average:>9.1f}")
+
+
+def output_plan(plan: ProductionList, output: str) -> None:
+    """
+    Exports the plan to a CSV file, or prints it if no file was given
+    """
+    if output:
+        with open(output, "w", newline="") as file:
+            write_plan(plan, file)
+    else:
+        print_plan(plan)
+
+
+def output_chain_usage(chain_usage: list, output: str) -> None:
+    """
+    Exports the chain-wide usage to a CSV file, or prints it if no file was given
+    """
+    headers = ("Name", "Stores", "Entries", "Usage", "TotalUsage")
+    if output:
+        with open(output, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(headers)
+            writer.writerows(chain_usage)
+    else:
+        width = max([len(d[0]) for d in chain_usage] + [len(headers[0])])
+        print(f"{headers[0]:<{width}}  " + "  ".join(f"{header:>10}" for header in headers[1:]))
+        for name, stores, entries, usage, total_usage in chain_usage:
+            print(f"{name:<{width}}  {stores:>10}  {entries:>10}  {usage:>10.1f}  {total_usage:>10.1f}")
+
+
+def open_database(conn_string: str, write: bool) -> None:
+    """
+    Makes sure the database file exists. Commands that write bring it up to the latest schema,
+    commands that only read require it to be there already, so reading never changes the file
+    """
+    if not os.path.isfile(conn_string):
+        raise Exception(f"{conn_string}: no such database file")
+    if write:
+        migrate(conn_string)
+    else:
+        check_schema(conn_string)
+
+
+def print_progress(rows: int, seconds: float) -> None:
+    """
+    Reports the progress of a bulk import or export
+    """
+    print(f"{rows} rows, {rows / seconds if seconds > 0 else 0:.0f} rows/sec", file=sys.stderr)
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate and complete daily production lists without the GUI")
+    parser.add_argument("--database", default=CONNECTION_STRING, help="database file to use")
+    parser.add_argument("--trace", help="append every database call to a JSON-lines file")
+    parser.add_argument("--query-stats", action="store_true", help="print timings of the database calls when done")
+    parser.add_argument("--slow-query", type=float, default=SLOW_QUERY_THRESHOLD,
+                        help="seconds after which a database call is marked as slow")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    plan_parser = commands.add_parser("plan", help="generate a new production list and print or export it")
+    complete_parser = commands.add_parser("complete", help="complete a production list with counts from a CSV file")
+    complete_parser.add_argument("counts", help="CSV file with ProductID, Remaining, Discarded and optional Produced columns")
+    complete_parser.add_argument("--date", type=date.fromisoformat, default=date.today(),
+                                 help="date the counts belong to, defaults to today")
+    complete_parser.add_argument("--dry-run", action="store_true", help="don't write the list to the database")
+    chain_parser = commands.add_parser("chain", help="calculate chain-wide usage over a directory of store databases")
+    chain_parser.add_argument("directory", help="directory with one database file per store")
+    chain_parser.add_argument("--workers", type=int, help="number of processes, defaults to the number of cores")
+    for command_parser in (plan_parser, complete_parser, chain_parser):
+        command_parser.add_argument("--days", type=positive_int, default=30, help="number of days to average over")
+        command_parser.add_argument("--output", help="export the plan to a CSV file instead of printing it")
+    import_parser = commands.add_parser("import", help="load production history from a CSV file")
+    import_parser.add_argument("path", help="CSV file with ProductID, Date, Remaining, Discarded and Produced columns")
+    export_parser = commands.add_parser("export", help="save the production history to a CSV file")
+    export_parser.add_argument("path", help="CSV file to write")
+    for command_parser in (import_parser, export_parser):
+        command_parser.add_argument("--chunk-size", type=int, default=50000, help="number of rows handled at a time")
+
+    args = parser.parse_args(argv)
+
+    if args.trace is not None or args.query_stats:
+        enable_tracing(args.trace, args.slow_query)
+    try:
+        return run_command(args)
+    finally:
+        disable_tracing()
+        if args.query_stats:
+            print(format_query_stats(), file=sys.stderr)
+
+
+def run_command(args: argparse.Namespace) -> int:
+    """
+    Runs the parsed command and returns the exit code
+    """
+    if args.command in ("import", "export"):
+        bulk_operation = import_production_data if args.command == "import" else export_production_data
+        try:
+            open_database(args.database, write=args.command == "import")
+            rows, seconds, rate = bulk_operation(args.database, args.path, args.chunk_size, print_progress)
+        except Exception as error:
+            print(f"error: {error}", file=sys.stderr)
+            return 1
+        print(f"{args.command}ed {rows} rows in {seconds:.2f}s ({rate:.0f} rows/sec)", file=sys.stderr)
+        return 0
+
+    if args.command == "chain":
+        # Only the chain command needs the store reports, the other commands start without them
+        from shards import get_chain_usage
+
+        try:
+            store_usage, chain_usage = get_chain_usage(args.directory, args.days, args.workers)
+        except Exception as error:
+            print(f"error: {error}", file=sys.stderr)
+            return 1
+        output_chain_usage(chain_usage, args.output)
+        return 0
+
+    try:
+        open_database(args.database, write=args.command == "complete" and not args.dry_run)
+        plan = build_plan(args.database, args.days)
+
+        if args.command == "complete":
+            complete_plan(plan, read_counts(args.counts))
+            if not args.dry_run:
+                insert_production_data(args.database, plan.to_tuples(args.date))
+    except Exception as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+
+    output_plan(plan, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
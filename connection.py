@@ -0,0 +1,108 @@
+import sqlite3
+import threading
+import weakref
+
+# Number of prepared statements every connection keeps around for reuse
+CACHED_STATEMENTS = 256
+# Page cache size per connection, negative values are in KiB (here 16 MiB)
+CACHE_SIZE = -16384
+
+
+class ConnectionManager():
+    """
+    Owns long-lived connections to a single database file.
+    Every thread gets its own connection, so background readers never share
+    a handle with the GUI thread, while each connection keeps its prepared
+    statements and page cache warm between calls.
+    Connections belong to the thread objects, not to thread-local data, which Qt's
+    thread pool drops after every task. A connection is closed once its thread has
+    exited and is no longer referenced. Threads Python didn't start, such as Qt's,
+    are never released, so a thread pool using the database must keep its threads.
+    One more connection, shared by all threads, only watches the database for commits
+    """
+    def __init__(self, conn_string: str) -> None:
+        self.conn_string = conn_string
+        self.lock = threading.Lock()
+        self.connections = weakref.WeakKeyDictionary()
+        self.watcher = None
+
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        Returns the connection for the calling thread, opening it on first use
+        """
+        thread = threading.current_thread()
+        conn = self.connections.get(thread)
+        if conn is None:
+            conn = sqlite3.connect(self.conn_string, cached_statements=CACHED_STATEMENTS,
+                                   check_same_thread=False)
+            conn.execute(f"PRAGMA cache_size = {CACHE_SIZE}")
+            with self.lock:
+                self.connections[thread] = conn
+            weakref.finalize(thread, conn.close)
+        return conn
+
+
+    def data_version(self) -> int:
+        """
+        Returns a number that changes whenever any other connection, in this process or another,
+        commits to the database. It's read on the watcher connection, so every thread gets a comparable number
+        """
+        with self.lock:
+            if self.watcher is None:
+                self.watcher = sqlite3.connect(self.conn_string, check_same_thread=False)
+            return self.watcher.execute("PRAGMA data_version").fetchone()[0]
+
+
+    def close(self) -> None:
+        """
+        Closes every connection opened by the manager
+        """
+        with self.lock:
+            for conn in self.connections.values():
+                conn.close()
+            self.connections.clear()
+            if self.watcher is not None:
+                self.watcher.close()
+                self.watcher = None
+
+
+MANAGERS = {}
+MANAGERS_LOCK = threading.Lock()
+
+
+def get_manager(conn_string: str) -> ConnectionManager:
+    """
+    Returns the connection manager for a database, creating it on first use
+    """
+    with MANAGERS_LOCK:
+        manager = MANAGERS.get(conn_string)
+        if manager is None:
+            manager = ConnectionManager(conn_string)
+            MANAGERS[conn_string] = manager
+        return manager
+
+
+def get_connection(conn_string: str) -> sqlite3.Connection:
+    """
+    Returns a long-lived connection to the database for the calling thread.
+    Used as a context manager it commits or rolls back the transaction but stays open
+    """
+    return get_manager(conn_string).connection()
+
+
+def get_data_version(conn_string: str) -> int:
+    """
+    Returns a number that changes whenever a connection commits to the database
+    """
+    return get_manager(conn_string).data_version()
+
+
+def close_connections() -> None:
+    """
+    Closes all connections to all databases, used on application exit
+    """
+    with MANAGERS_LOCK:
+        for manager in MANAGERS.values():
+            manager.close()
+        MANAGERS.clear()
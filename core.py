@@ -0,0 +1,671 @@
+from array import array
+from datetime import date
+from itertools import groupby
+from operator import itemgetter
+import sqlite3
+import zlib
+from statistics import mean
+from math import ceil
+from connection import get_connection
+from cache import cached_query, mark_changed, INSTRUCTIONS_CACHE
+from tracing import traced_query
+
+CONNECTION_STRING = "database.db"
+# Rounding error, in packages, ignored when dividing production numbers into packages
+PACKAGE_TOLERANCE = 1e-9
+# Instructions longer than this many bytes are stored compressed, None (the default) stores
+# them as plain text, which keeps the table editable by hand
+COMPRESS_INSTRUCTIONS_OVER = None
+
+# MODELS
+class ProductionDataModel():
+    """
+    Data model for ProductionData table entries
+    """
+    __slots__ = ("id", "name", "portions_from_package", "can_portion_partially", "remaining",
+                 "discarded", "produced", "average", "completed")
+
+    def __init__(self) -> None:
+        self.id = 0
+        self.name = ""
+        self.portions_from_package = 0.0
+        self.can_portion_partially = False
+        self.remaining = 0.0
+        self.discarded = 0.0
+        self.produced = 0.0
+        self.average = 0.0
+        self.completed = False
+
+    
+    def from_tuple_new(self, data: tuple) -> None:
+        """
+        Takes data from the database query for a new production list and populates the variables accordingly
+        """
+        self.id = data[0]
+        self.name = data[1]
+        self.portions_from_package = data[2]
+        self.can_portion_partially = data[3]
+        self.remaining = data[4]
+        self.discarded = data[5]
+        self.produced = data[6]
+        self.average = data[6]
+
+    
+    def from_tuple_old(self, data: tuple) -> None:
+        """
+        Takes data from the database query for an old production list and populates the variables accordingly
+        """
+        self.id = data[0]
+        self.name = data[1]
+        self.remaining = data[2]
+        self.discarded = data[3]
+        self.produced = data[4]
+        
+
+    def to_tuple(self) -> tuple:
+        """
+        Generates tuple from the variables, used for database entry
+        """
+        return (self.id, date.today(), self.remaining, self.discarded, self.produced)
+
+
+class ProductModel():
+    """
+    Data model for ProductionData table entries
+    """
+    __slots__ = ("id", "name", "package_name", "portions_from_package", "can_portion_partially", "instructions")
+
+    def __init__(self) -> None:
+        self.id = 0
+        self.name = ""
+        self.package_name = ""
+        self.portions_from_package = 0.0
+        self.can_portion_partially = False
+        self.instructions = ""
+
+
+    def from_tuple(self, data: tuple) -> None:
+        """
+        Takes data from the database query and populates the variables accordingly.
+        The catalog query leaves out the instructions, which stay None until they are loaded
+        """
+        self.id = data[0]
+        self.name = data[1]
+        self.package_name = data[2]
+        self.portions_from_package = data[3]
+        self.can_portion_partially = data[4]
+        self.instructions = data[5] if len(data) > 5 else None
+
+
+    def to_tuple(self) -> tuple:
+        """
+        Generates a tuple from the variables
+        """
+        return (self.id, self.name, self.package_name, 
+                self.portions_from_package, self.can_portion_partially,
+                self.instructions)
+    
+
+    def to_tuple_update(self) -> tuple:
+        """
+        Generates a tuple from the variables used in database updates
+        """
+        return (self.name, self.package_name, 
+                self.portions_from_package, self.can_portion_partially,
+                self.instructions)
+
+
+def column_property(column: str, convert = None) -> property:
+    """
+    Creates a property that reads and writes one column of a ProductionList for the row
+    """
+    def getter(self) -> object:
+        value = getattr(self.production_list, column)[self.row]
+        return value if convert is None else convert(value)
+
+    def setter(self, value: object) -> None:
+        getattr(self.production_list, column)[self.row] = value
+
+    return property(getter, setter)
+
+
+class ProductionRow():
+    """
+    A row of a ProductionList, read and written like a ProductionDataModel
+    """
+    __slots__ = ("production_list", "row")
+
+    id = column_property("ids")
+    name = column_property("names")
+    portions_from_package = column_property("portions_from_package")
+    can_portion_partially = column_property("can_portion_partially", bool)
+    remaining = column_property("remaining")
+    discarded = column_property("discarded")
+    produced = column_property("produced")
+    average = column_property("averages")
+    completed = column_property("completed", bool)
+
+    def __init__(self, production_list: "ProductionList", row: int) -> None:
+        self.production_list = production_list
+        self.row = row
+
+
+    def to_tuple(self) -> tuple:
+        """
+        Generates tuple from the variables, used for database entry
+        """
+        return (self.id, date.today(), self.remaining, self.discarded, self.produced)
+
+
+class ProductionList():
+    """
+    A production list stored by column, one array per value with a row for every product.
+    Rows are found by product ID in constant time and every column can be calculated on as a whole.
+    Indexing or iterating returns ProductionRows, so it can be used like a list of ProductionDataModels
+    """
+    def __init__(self) -> None:
+        self.clear()
+
+
+    def clear(self) -> None:
+        """
+        Removes every row
+        """
+        self.ids = array("q")
+        self.names = []
+        self.portions_from_package = array("d")
+        self.can_portion_partially = array("b")
+        self.remaining = array("d")
+        self.discarded = array("d")
+        self.produced = array("d")
+        self.averages = array("d")
+        self.completed = array("b")
+        self.rows = array("i")
+
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+    def __getitem__(self, row: int) -> ProductionRow:
+        if not -len(self.ids) <= row < len(self.ids):
+            raise IndexError("production list row out of range")
+        return ProductionRow(self, row % len(self.ids))
+
+
+    def __iter__(self):
+        for row in range(len(self.ids)):
+            yield ProductionRow(self, row)
+
+
+    def append(self, model: ProductionDataModel) -> None:
+        """
+        Adds a row with the values of a ProductionDataModel or of another list's row
+        """
+        self.add_row(model.id, len(self.ids))
+        self.ids.append(model.id)
+        self.names.append(model.name)
+        self.portions_from_package.append(model.portions_from_package)
+        self.can_portion_partially.append(bool(model.can_portion_partially))
+        self.remaining.append(model.remaining)
+        self.discarded.append(model.discarded)
+        self.produced.append(model.produced)
+        self.averages.append(model.average)
+        self.completed.append(bool(model.completed))
+
+
+    def load_new(self, data: list) -> None:
+        """
+        Replaces the rows with the database query for a new production list,
+        without creating a model for every product
+        """
+        self.clear()
+        if not data:
+            return
+        ids, names, portions_from_package, can_portion_partially, remaining, discarded, produced = zip(*data)
+        # Columns are created at their final size
+        self.ids = array("q", ids)
+        self.names = list(names)
+        self.portions_from_package = array("d", portions_from_package)
+        self.can_portion_partially = array("b", map(bool, can_portion_partially))
+        self.remaining = array("d", remaining)
+        self.discarded = array("d", discarded)
+        self.produced = array("d", produced)
+        self.averages = array("d", produced)
+        self.completed = array("b", bytes(len(ids)))
+        self.index_rows()
+
+
+    def index_rows(self) -> None:
+        """
+        Builds the lookup from product ID to row. Product IDs are mostly consecutive,
+        so a table with the row at the position of every ID is used, unless the IDs are spread too far apart
+        """
+        self.rows = array("i")
+        if len(self.ids) > 0 and min(self.ids) >= 0 and max(self.ids) <= self.max_table_id(len(self.ids)):
+            self.rows = array("i", [-1]) * (max(self.ids) + 1)
+            for row, id in enumerate(self.ids):
+                self.rows[id] = row
+        elif len(self.ids) > 0:
+            self.rows = dict(zip(self.ids, range(len(self.ids))))
+
+
+    def max_table_id(self, row_count: int) -> int:
+        """
+        Returns the highest product ID the lookup table is used for with a number of rows
+        """
+        return 4 * row_count + 1024
+
+
+    def add_row(self, product_id: int, row: int) -> None:
+        """
+        Adds a row to the lookup, switching to a dictionary once the IDs get too sparse for a table
+        """
+        if isinstance(self.rows, array):
+            if 0 <= product_id <= self.max_table_id(row + 1):
+                if product_id >= len(self.rows):
+                    self.rows.extend(array("i", [-1]) * (product_id + 1 - len(self.rows)))
+                self.rows[product_id] = row
+                return
+            self.rows = dict(zip(self.ids, range(len(self.ids))))
+        self.rows[product_id] = row
+
+
+    def row_of(self, product_id: int) -> int:
+        """
+        Returns the row of a product, or None if it isn't on the list
+        """
+        if isinstance(self.rows, dict):
+            return self.rows.get(product_id)
+        if 0 <= product_id < len(self.rows) and self.rows[product_id] >= 0:
+            return self.rows[product_id]
+        return None
+
+
+    def get(self, product_id: int) -> ProductionRow:
+        """
+        Returns the row of a product to read or write its values, or None if it isn't on the list
+        """
+        row = self.row_of(product_id)
+        return None if row is None else ProductionRow(self, row)
+
+
+    def to_tuples(self, list_date: date = None) -> list:
+        """
+        Generates a tuple for every row, used for database entry
+        """
+        list_date = list_date or date.today()
+        return list(zip(self.ids, [list_date] * len(self.ids), self.remaining, self.discarded, self.produced))
+# MODELS
+
+# CALCULATIONS
+def calculate_usage(remaining: list, discarded: list,
+                    produced: list, rounding_point: int = 1) -> float:
+    """
+    Calculates the average usage for a given product, rounded to a specific decimal point
+    """
+    return calculate_usage_from_averages(mean(remaining), mean(discarded), mean(produced), rounding_point)
+
+
+def calculate_usage_from_averages(average_remaining: float, average_discarded: float,
+                                  average_produced: float, rounding_point: int = 1) -> float:
+    """
+    Calculates the average usage for a given product from already averaged values,
+    rounded to a specific decimal point
+    """
+    usage = (average_remaining + average_produced) - average_discarded
+
+    return round(usage, rounding_point)
+
+
+def calculate_production(remaining: float, average: float, 
+                         safety_margin: float = 1, rounding_point: int = 1) -> float:
+    """
+    Calculates the sugested production numbers for the day, based on a safety margin
+    and rounded to a specific decimal point
+    """
+    produce = (average - remaining) * safety_margin
+    if produce < 0:
+        produce = 0
+
+    return round(produce, rounding_point)
+
+
+def adjust_for_packaging(production: float, can_portion_partially: bool, 
+                         portions_per_package: float, rounding_point: int = 1) -> float:
+    """
+    Adjusts the production number based on:
+    * the number of portions derived from one packaging
+    * wether or not the whole packaging must be used
+    Products without a package size (zero portions) are never rounded up
+    """
+    if not can_portion_partially and portions_per_package > 0:
+        if production <= 0:
+            return 0
+        # The tolerance keeps an exact multiple like 0.3 / 0.1 from rounding up a whole package
+        packages = ceil(production / portions_per_package - PACKAGE_TOLERANCE)
+        return round(packages * portions_per_package, rounding_point)
+    
+    return round(production, rounding_point)
+# CALCULATIONS
+
+# DATABASE OPS
+@traced_query
+def get_all_products(conn_string: str,) -> list:
+    """
+    Retrieves all the products from the database, without their instructions,
+    and returns them as an array of tuples
+    """
+    try:
+        with get_connection(conn_string) as conn:
+            # Instructions can be large, they are loaded on their own by get_product_instructions
+            result = conn.cursor().execute("""
+                SELECT ID, Name, PackageName, PortionsFromPackage, CanPortionPartially FROM Products
+            """)
+            return result.fetchall()
+    except sqlite3.OperationalError as error:
+        raise Exception(error)
+        
+
+def compress_instructions(instructions: str) -> object:
+    """
+    Returns the instructions as they are stored: compressed bytes if they are long enough, otherwise the text
+    """
+    data = instructions.encode()
+    if COMPRESS_INSTRUCTIONS_OVER is not None and len(data) > COMPRESS_INSTRUCTIONS_OVER:
+        return zlib.compress(data)
+    return instructions
+
+
+def decompress_instructions(stored: object) -> str:
+    """
+    Returns the text of stored instructions, whether they were compressed or not
+    """
+    if isinstance(stored, bytes):
+        return zlib.decompress(stored).decode()
+    return stored
+
+
+@traced_query
+def get_product_instructions(conn_string: str, product_id: int) -> str:
+    """
+    Fetches the instructions of a single product, None if there is no such product.
+    Recently used instructions are kept in a cache bounded by their total size
+    """
+    def load() -> str:
+        try:
+            with get_connection(conn_string) as conn:
+                result = conn.cursor().execute("SELECT Instructions FROM Products WHERE ID = ?", (product_id,))
+                row = result.fetchone()
+        except sqlite3.OperationalError as error:
+            raise Exception(error)
+        return None if row is None else decompress_instructions(row[0])
+
+    return INSTRUCTIONS_CACHE.get(conn_string, ("get_product_instructions", product_id), load)
+
+
+@traced_query
+def insert_product(conn_string: str, product_data: tuple) -> None:
+    """
+    Adds a new product to the database
+    """
+    try:
+        with get_connection(conn_string) as conn:
+            result = conn.cursor().execute("""
+                INSERT INTO Products 
+                (Name, PackageName, PortionsFromPackage, CanPortionPartially, Instructions)
+                VALUES (?, ?, ?, ?, ?)
+            """, product_data[0:4] + (compress_instructions(product_data[4]),))
+    except sqlite3.OperationalError as error:
+        raise Exception(error)
+
+    mark_changed(conn_string)
+
+
+@traced_query
+def delete_product(conn_string: str, product_id: int) -> None:
+    """
+    Removes a product from the database
+    """
+    try:
+        with get_connection(conn_string) as conn:
+            result = conn.cursor().execute("DELETE FROM Products WHERE ID=?", (product_id,))
+    except sqlite3.OperationalError as error:
+        raise Exception(error)
+
+    mark_changed(conn_string)
+
+
+@traced_query
+def update_product(conn_string: str, product_data: tuple, product_id: int):
+    """
+    Updates an existing product in the database
+    """
+    try:
+        with get_connection(conn_string) as conn:
+            data = product_data[0:4] + (compress_instructions(product_data[4]), product_id)
+            result = conn.cursor().execute("""
+                UPDATE Products
+                SET Name = ?, PackageName = ?,
+                    PortionsFromPackage = ?, 
+                    CanPortionPartially = ?,
+                    Instructions = ?
+                WHERE ID = ?
+            """, data)
+    except sqlite3.OperationalError as error:
+        raise Exception(error)
+
+    mark_changed(conn_string)
+
+
+@traced_query
+def insert_production_data(conn_string: str, production_list: list) -> None:
+    """
+    Adds production data for the entire new list to the database
+    and updates the running usage totals and the service days in the same transaction
+    """
+    try:
+        with get_connection(conn_string) as conn:
+            cursor = conn.cursor()
+            result = cursor.executemany("""
+                INSERT INTO ProductionData 
+                (ProductID, Date, Remaining, Discarded, Produced)
+                VALUES (?, ?, ?, ?, ?)
+            """, production_list)
+            # Start the day from the latest totals before it, if there is no row for it yet
+            result = cursor.executemany("""
+                INSERT OR IGNORE INTO UsageTotals
+                (ProductID, Date, Entries, Remaining, Discarded, Produced)
+                SELECT :id, :date, COALESCE(Entries, 0), COALESCE(Remaining, 0),
+                COALESCE(Discarded, 0), COALESCE(Produced, 0)
+                FROM (SELECT 1)
+                LEFT JOIN (
+                    SELECT * FROM UsageTotals
+                    WHERE ProductID = :id AND Date < :date
+                    ORDER BY Date DESC LIMIT 1
+                )
+            """, (dict(id=d[0], date=d[1]) for d in production_list))
+            # Add the entry to the day and to any later days, in case of a backdated entry
+            result = cursor.executemany("""
+                UPDATE UsageTotals
+                SET Entries = Entries + 1, Remaining = Remaining + ?,
+                    Discarded = Discarded + ?, Produced = Produced + ?
+                WHERE ProductID = ? AND Date >= ?
+            """, ((d[2], d[3], d[4], d[0], d[1]) for d in production_list))
+            result = cursor.executemany("""
+                INSERT OR IGNORE INTO ServiceDays (Date) VALUES (?)
+            """, ((list_date,) for list_date in set(d[1] for d in production_list)))
+    except sqlite3.OperationalError as error:
+        raise Exception(error)
+
+    mark_changed(conn_string)
+
+
+@traced_query
+def get_service_days(conn_string: str, days: int) -> list:
+    """
+    Returns the last N days the kitchen ran, the latest first
+    """
+    if days <= 0:
+        raise ValueError(f"Number of days must be positive, got {days}")
+    try:
+        with get_connection(conn_string) as conn:
+            result = conn.cursor().execute("""
+                SELECT Date FROM ServiceDays ORDER BY Date DESC LIMIT (?)
+            """, (days,))
+            return [d[0] for d in result.fetchall()]
+    except sqlite3.OperationalError as error:
+        raise Exception(error)
+
+
+def iterate_history(conn_string: str, start_date: date):
+    """
+    Streams the production data from a date onwards grouped by product, in product ID order.
+    Yields a (product id, entries) tuple for every product with data, the entries being
+    (date, remaining, discarded, produced) tuples in date order.
+    Rows are read from the cursor as they are needed, so only one product's entries are in memory at a time
+    """
+    try:
+        conn = get_connection(conn_string)
+        # CROSS JOIN keeps Products as the outer loop, so the rows come out of the
+        # (ProductID, Date) index already in order instead of being sorted first
+        result = conn.cursor().execute("""
+            SELECT Products.ID, ProductionData.Date, ProductionData.Remaining,
+            ProductionData.Discarded, ProductionData.Produced
+            FROM Products
+            CROSS JOIN ProductionData
+            ON ProductionData.ProductID = Products.ID AND ProductionData.Date >= (?)
+            ORDER BY Products.ID ASC, ProductionData.Date ASC
+        """, (start_date,))
+        for product_id, rows in groupby(result, key=itemgetter(0)):
+            yield product_id, [row[1:] for row in rows]
+    except sqlite3.OperationalError as error:
+        raise Exception(error)
+
+
+@traced_query
+def get_usage_sums(conn_string: str, windows: tuple = (1, 7, 14, 30)) -> list:
+    """
+    Calculates the number of entries and the sums of remaining, discarded and produced
+    for every product over one or more N-day windows using a single query.
+    Sums are the difference between the latest running totals of a product
+    and its totals from before the window, so the cost does not grow with the history.
+    Returns a tuple for every product, the last element being a dictionary that maps
+    each window to an (entries, remaining, discarded, produced) tuple
+    """
+    windows = tuple(sorted(set(windows)))
+    if windows[0] <= 0:
+        raise ValueError(f"Number of days must be positive, got {windows[0]}")
+
+    try:
+        with get_connection(conn_string) as conn:
+            # The day before each window starts, None if the history is shorter than the window
+            dates = get_service_days(conn_string, windows[-1] + 1)
+            bounds = [dates[days] if days < len(dates) else None for days in windows]
+
+            columns = []
+            joins = []
+            for n in range(len(windows)):
+                for column in ("Entries", "Remaining", "Discarded", "Produced"):
+                    columns.append(f"Latest.{column} - COALESCE(Before{n}.{column}, 0)")
+                joins.append(f"""
+                    LEFT JOIN UsageTotals AS Before{n}
+                    ON Before{n}.ProductID = Products.ID AND Before{n}.Date = (
+                        SELECT MAX(Date) FROM UsageTotals
+                        WHERE ProductID = Products.ID AND Date <= ?
+                    )
+                """)
+
+            result = conn.cursor().execute(f"""
+                SELECT Products.ID, Products.Name,
+                Products.PortionsFromPackage, Products.CanPortionPartially,
+                {", ".join(columns)}
+                FROM Products
+                JOIN UsageTotals AS Latest
+                ON Latest.ProductID = Products.ID AND Latest.Date = (
+                    SELECT MAX(Date) FROM UsageTotals WHERE ProductID = Products.ID
+                )
+                {"".join(joins)}
+                WHERE Latest.Entries - COALESCE(Before{len(windows) - 1}.Entries, 0) > 0
+                ORDER BY Products.ID ASC
+            """, bounds)
+            data = result.fetchall()
+    except sqlite3.OperationalError as error:
+        raise Exception(error)
+
+    return_data = []
+    for d in data:
+        sums = {}
+        for n, days in enumerate(windows):
+            sums[days] = d[4 + n * 4:8 + n * 4]
+        return_data.append(d[0:4] + (sums,))
+
+    return return_data
+
+
+@traced_query
+def get_usage_aggregates(conn_string: str, windows: tuple = (1, 7, 14, 30)) -> list:
+    """
+    Calculates the average remaining, discarded and produced numbers for every product
+    over one or more N-day windows.
+    Returns a tuple for every product, the last element being a dictionary that maps
+    each window to an (average remaining, average discarded, average produced) tuple,
+    or None if the product has no data in that window
+    """
+    return_data = []
+    for d in get_usage_sums(conn_string, windows):
+        averages = {}
+        for days, (entries, remaining, discarded, produced) in d[4].items():
+            averages[days] = (remaining / entries, discarded / entries, produced / entries) if entries else None
+        return_data.append(d[0:4] + (averages,))
+
+    return return_data
+
+
+@traced_query
+@cached_query
+def get_data_for_new_list(conn_string: str, days: int) -> list:
+    """
+    Retrieve the average production data for all products over an N-day period
+    Calculate average usage and return a tuple for every product
+    """
+    return_data = []
+
+    for d in get_usage_aggregates(conn_string, (days,)):
+        id, name, portions_from_package, can_portion_partially, averages = d
+        usage = calculate_usage_from_averages(*averages[days])
+        adjusted = adjust_for_packaging(usage, can_portion_partially, portions_from_package)
+        return_data.append((id, name, portions_from_package, can_portion_partially, 0, 0, adjusted))
+
+    return return_data
+        
+
+@traced_query
+def get_old_list(conn_string: str, date: date) -> list:
+    """
+    Retrieve production data for a previous date
+    """
+    try:
+        with get_connection(conn_string) as conn:
+            result = conn.cursor().execute("""
+                SELECT Products.ID, Products.Name, ProductionData.Remaining,
+                ProductionData.Discarded, ProductionData.Produced
+                FROM Products
+                LEFT JOIN ProductionData
+                ON Products.ID = ProductionData.ProductID
+                WHERE ProductionData.Date == (?)
+                ORDER BY Products.ID ASC
+            """, (date,))
+            return result.fetchall()
+    except sqlite3.OperationalError as error:
+        raise Exception(error)
+
+
+@traced_query
+def get_average_usage_by_product(conn_string: str, days: int) -> dict:
+    """
+    Fetches the average usage over N number of days for each product with data in that period,
+    adjusted for packaging, and returns it as a dictionary keyed by product ID
+    """
+    return {d[0]: d[6] for d in get_data_for_new_list(conn_string, days)}
+# DATABASE OPS
@@ -1,7 +1,25 @@
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date, timedelta
-from random import uniform, randint
-from statistics import mean
+from random import uniform, randint, choice, seed
 import sqlite3
+from migrations import migrate
+from bulk import drop_production_indexes, restore_production_indexes
+
+# Number of rows passed to one executemany call, also about the rows generated by one pool task
+BATCH_SIZE = 50000
+# Batches generated ahead of the inserts per worker process
+BATCHES_AHEAD = 2
+PACKAGE_NAMES = ("Bag", "Box", "Bottle", "Tub", "Tray")
+# Days of the week with lower remaining numbers, counted from the first generated day
+BUSY_DAY_PROFILES = {
+    "none": [],
+    "weekend": [6, 7],
+    "midweek": [3, 4, 5],
+    "friday": [5],
+}
 
 
 def generate_remaining(count: int, min: float, max: float, busy_days: list, 
@@ -22,7 +40,7 @@ def generate_remaining(count: int, min: float, max: float, busy_days: list,
         if day_of_week in busy_days:
             num_to_add -= busy_day_modifier
             if num_to_add < 0:
-                num_to_add == 0
+                num_to_add = 0
 
         result.append(round(num_to_add, rounding_point))
 
@@ -79,11 +97,19 @@ def generate_prod_data(count: int, id: int, date: date, initial_production: int,
     # Add the initial production number
     produced.append(initial_production)
 
+    # Running sums of the days so far, so every average is calculated in constant time
+    remaining_sum = 0.0
+    discarded_sum = 0.0
+    produced_sum = 0.0
+
     # Calculate and fill production numbers
     for n in range(count):
         # Skip the zero index
         if n != 0:
-            average = calculate_usage(remaining[0:n], discarded[0:n], produced[0:n])
+            remaining_sum += remaining[n - 1]
+            discarded_sum += discarded[n - 1]
+            produced_sum += produced[n - 1]
+            average = calculate_usage_from_sums(remaining_sum, discarded_sum, produced_sum, n)
             prod_number = calculate_production(remaining[n], average, 1, rounding_point)
             produced.append(prod_number)
 
@@ -95,12 +121,13 @@ def generate_prod_data(count: int, id: int, date: date, initial_production: int,
     return result
 
 
-def calculate_usage(remaining: list, discarded: list,
-                    produced: list, rounding_point: int = 1) -> float:
+def calculate_usage_from_sums(remaining: float, discarded: float,
+                              produced: float, count: int, rounding_point: int = 1) -> float:
     """
-    Calculates the average usage for a given product, rounded to a specific decimal point
+    Calculates the average usage for a given product from the sums of N days,
+    rounded to a specific decimal point
     """
-    usage = (mean(remaining) + mean(produced)) - mean(discarded)
+    usage = (remaining / count + produced / count) - discarded / count
 
     return round(usage, rounding_point)
 
@@ -118,29 +145,159 @@ def calculate_production(remaining: float, average: float,
     return round(produce, rounding_point)
 
 
-def insert_production_data(conn_string: str, production_data: tuple) -> None:
+def insert_production_data(conn: sqlite3.Connection, batches) -> int:
     """
-    Add ne production data for a certain product to the database
+    Adds production data to the database through an open connection, one batch of rows at a time
+    as the batches arrive. The indexes are dropped while loading and everything is committed at once.
+    Returns the number of rows
     """
+    rows = 0
     try:
-        with sqlite3.connect(conn_string) as conn:
-            result = conn.cursor().execute("""
+        conn.execute("BEGIN IMMEDIATE")
+        indexes = drop_production_indexes(conn)
+        for batch in batches:
+            result = conn.cursor().executemany("""
                 INSERT INTO ProductionData 
                 (ProductID, Date, Remaining, Discarded, Produced)
                 VALUES (?, ?, ?, ?, ?)
-            """, production_data)
+            """, batch)
+            rows += len(batch)
+        # The rows bypass the DB OPS, so the running usage totals are rebuilt as well
+        restore_production_indexes(conn, indexes)
+        conn.commit()
     except sqlite3.OperationalError as error:
+        conn.rollback()
         raise Exception(error)
 
+    return rows
 
-def main():
-    data = generate_prod_data(30, 10, date.today(), 2,
-                              1, 1.5, 0.5, 1.2, [4,5,6],
-                              0.5, 30, 1)
-    
-    for n in data:
-        insert_production_data("test_database.db", n)
+
+def generate_product(product_id: int, scenario_seed: int, package_sizes: tuple, partial_chance: int) -> tuple:
+    """
+    Generates a product for the Products table. The same seed and ID always give the same product,
+    so every store of a scenario shares the catalog
+    """
+    seed(f"{scenario_seed}:product:{product_id}")
+    return (product_id, f"Product {product_id}", choice(PACKAGE_NAMES), choice(package_sizes),
+            randint(1, 100) <= partial_chance, "")
+
+
+def generate_product_history(product_id: int, store: int, scenario_seed: int,
+                             count: int, end_date: date, busy_day_profiles: tuple) -> list:
+    """
+    Generates the production data of one product in one store, with its own seed,
+    usage level and busy-day profile
+    """
+    seed(f"{scenario_seed}:store:{store}:product:{product_id}")
+    usage = uniform(1, 20)
+    busy_days = BUSY_DAY_PROFILES[choice(busy_day_profiles)]
+    return generate_prod_data(count, product_id, end_date, round(usage),
+                              usage * 0.1, usage * 0.5, usage * 0.05, usage * 0.2,
+                              busy_days, usage * 0.2, randint(5, 40), 1)
+
+
+def generate_history_batch(product_ids: range, store: int, scenario_seed: int,
+                           count: int, end_date: date, busy_day_profiles: tuple) -> list:
+    """
+    Generates the production data of several products in one store, a single task for the process pool
+    """
+    data = []
+    for id in product_ids:
+        data += generate_product_history(id, store, scenario_seed, count, end_date, busy_day_profiles)
+    return data
+
+
+def generate_store_history(executor: ProcessPoolExecutor, workers: int, store: int, products: int,
+                           days: int, end_date: date, scenario_seed: int, busy_day_profiles: tuple):
+    """
+    Generates the production data of a store on the process pool, yielding it in batches of
+    about BATCH_SIZE rows in product order. Only a few batches per worker are generated ahead,
+    so memory doesn't grow with the size of the store
+    """
+    per_batch = max(1, BATCH_SIZE // max(days, 1))
+    ids = range(1, products + 1)
+    pending = deque()
+    for n in range(0, products, per_batch):
+        pending.append(executor.submit(generate_history_batch, ids[n:n + per_batch], store,
+                                       scenario_seed, days, end_date, busy_day_profiles))
+        if len(pending) >= workers * BATCHES_AHEAD:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def generate_store(executor: ProcessPoolExecutor, workers: int, path: str, store: int, products: int,
+                   days: int, end_date: date, scenario_seed: int, package_sizes: tuple,
+                   partial_chance: int, busy_day_profiles: tuple) -> int:
+    """
+    Creates a complete store database with the product catalog and its production history,
+    inserting the history as the process pool generates it.
+    Returns the number of production data rows
+    """
+    migrate(path)
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            result = conn.cursor().executemany("""
+                INSERT OR REPLACE INTO Products
+                (ID, Name, PackageName, PortionsFromPackage, CanPortionPartially, Instructions)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [generate_product(id, scenario_seed, package_sizes, partial_chance)
+                  for id in range(1, products + 1)])
+
+        return insert_production_data(conn, generate_store_history(executor, workers, store, products, days,
+                                                                   end_date, scenario_seed, busy_day_profiles))
+    finally:
+        conn.close()
+
+
+def generate_scenario(directory: str, products: int, days: int, stores: int = 1,
+                      scenario_seed: int = 0, end_date: date = None,
+                      package_sizes: tuple = (1, 4, 6, 10, 12), partial_chance: int = 50,
+                      busy_day_profiles: tuple = tuple(BUSY_DAY_PROFILES),
+                      workers: int = None) -> dict:
+    """
+    Generates one database per store in a directory, each holding N products with M days of history.
+    The histories are generated in batches of products by a process pool and streamed into the
+    databases, one store after the other. The same seed always gives the same data.
+    Returns the number of production data rows keyed by database path
+    """
+    end_date = end_date or date.today()
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(directory, exist_ok=True)
+    paths = [os.path.join(directory, f"store_{store}.db") for store in range(1, stores + 1)]
+    for path in paths:
+        if os.path.exists(path):
+            raise FileExistsError(f"{path} already exists")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return {path: generate_store(executor, workers, path, store, products, days, end_date,
+                                     scenario_seed, package_sizes, partial_chance, busy_day_profiles)
+                for store, path in enumerate(paths, 1)}
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Generate store databases filled with dummy production data")
+    parser.add_argument("directory", nargs="?", default="test_stores", help="directory to create the databases in")
+    parser.add_argument("--products", type=int, default=10, help="number of products per store")
+    parser.add_argument("--days", type=int, default=30, help="number of days of history")
+    parser.add_argument("--stores", type=int, default=1, help="number of store databases")
+    parser.add_argument("--seed", type=int, default=0, help="seed for reproducible data")
+    parser.add_argument("--package-sizes", type=float, nargs="+", default=[1, 4, 6, 10, 12],
+                        help="portions from a package to choose from")
+    parser.add_argument("--partial-chance", type=int, default=50,
+                        help="chance in percent that a product can be portioned partially")
+    parser.add_argument("--busy-days", nargs="+", choices=BUSY_DAY_PROFILES, default=list(BUSY_DAY_PROFILES),
+                        help="busy-day profiles to choose from")
+    parser.add_argument("--workers", type=int, help="number of processes, defaults to the number of cores")
+    args = parser.parse_args(argv)
+
+    rows = generate_scenario(args.directory, args.products, args.days, args.stores, args.seed,
+                             package_sizes=tuple(args.package_sizes), partial_chance=args.partial_chance,
+                             busy_day_profiles=tuple(args.busy_days), workers=args.workers)
+    for path, count in rows.items():
+        print(f"{path}: {count} rows")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
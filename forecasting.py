@@ -0,0 +1,152 @@
+import sqlite3
+import warnings
+import numpy as np
+from connection import get_connection
+from core import PACKAGE_TOLERANCE, ProductionList, get_service_days, iterate_history
+from tracing import traced_query
+
+
+# HISTORY
+@traced_query
+def load_history(conn_string: str, days: int) -> tuple:
+    """
+    Loads the production data of the last N days as (products x days) arrays.
+    Returns a tuple of product ids, portions from package, can portion partially flags,
+    the remaining, discarded and produced arrays and the number of entries behind every value.
+    Several entries on one day are averaged, days without an entry are NaN
+    """
+    try:
+        with get_connection(conn_string) as conn:
+            result = conn.cursor().execute("""
+                SELECT ID, PortionsFromPackage, CanPortionPartially
+                FROM Products ORDER BY ID ASC
+            """)
+            products = result.fetchall()
+    except sqlite3.OperationalError as error:
+        raise Exception(error)
+    dates = get_service_days(conn_string, days)
+
+    ids = np.array([p[0] for p in products], dtype=np.int64)
+    portions_from_package = np.array([p[1] for p in products], dtype=np.float64)
+    can_portion_partially = np.array([p[2] for p in products], dtype=bool)
+    sums = np.zeros((3, len(ids), len(dates)))
+    counts = np.zeros((len(ids), len(dates)))
+
+    if dates and len(ids) > 0:
+        columns = {d: n for n, d in enumerate(reversed(dates))}
+        # Both are in product ID order, so every product's row is found by moving forward
+        row = 0
+        for product_id, entries in iterate_history(conn_string, dates[-1]):
+            while row < len(ids) and ids[row] < product_id:
+                row += 1
+            # A product added since the catalog was read
+            if row == len(ids) or ids[row] != product_id:
+                continue
+            days_index = np.array([columns[entry[0]] for entry in entries], dtype=np.intp)
+            values = np.array([entry[1:] for entry in entries], dtype=np.float64).T
+            # A day can hold several entries, i.e. two lists completed on it
+            for n in range(3):
+                np.add.at(sums[n, row], days_index, values[n])
+            np.add.at(counts[row], days_index, 1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        history = np.where(counts > 0, sums / counts, np.nan)
+
+    return (ids, portions_from_package, can_portion_partially,
+            history[0], history[1], history[2], counts)
+# HISTORY
+
+# CALCULATIONS
+def batch_usage(remaining: np.ndarray, discarded: np.ndarray,
+                produced: np.ndarray, rounding_point: int = 1, counts: np.ndarray = None) -> np.ndarray:
+    """
+    Calculates the average usage for every product (row) at once, ignoring days without data.
+    With counts every value is weighted by the number of entries behind it, so each entry counts once.
+    Vectorized version of calculate_usage, products without any data get NaN
+    """
+    with warnings.catch_warnings():
+        # Rows without any data average to NaN, which is expected here
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        if counts is None:
+            usage = (np.nanmean(remaining, axis=-1) + np.nanmean(produced, axis=-1)) - np.nanmean(discarded, axis=-1)
+        else:
+            entries = np.sum(counts, axis=-1)
+            usage = (np.nansum(remaining * counts, axis=-1) + np.nansum(produced * counts, axis=-1)
+                     - np.nansum(discarded * counts, axis=-1)) / entries
+            usage[entries == 0] = np.nan
+
+    return np.round(usage, rounding_point)
+
+
+def batch_production(remaining: np.ndarray, average: np.ndarray,
+                     safety_margin: float = 1, rounding_point: int = 1) -> np.ndarray:
+    """
+    Calculates the sugested production numbers for every product at once.
+    Vectorized version of calculate_production
+    """
+    produce = np.maximum((np.asarray(average) - remaining) * safety_margin, 0)
+
+    return np.round(produce, rounding_point)
+
+
+def batch_adjust_for_packaging(production: np.ndarray, can_portion_partially: np.ndarray,
+                               portions_per_package: np.ndarray, rounding_point: int = 1) -> np.ndarray:
+    """
+    Adjusts the production numbers of every product at once for whole packages.
+    Vectorized version of adjust_for_packaging
+    """
+    production = np.asarray(production, dtype=np.float64)
+    portions_per_package = np.asarray(portions_per_package, dtype=np.float64)
+    whole = ~np.asarray(can_portion_partially, dtype=bool) & (portions_per_package > 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        packages = np.ceil(np.maximum(production, 0) / portions_per_package - PACKAGE_TOLERANCE)
+        result = np.where(whole, packages * portions_per_package, production)
+
+    return np.round(result, rounding_point)
+
+
+def forecast(conn_string: str, days: int, remaining: np.ndarray = None,
+             safety_margin: float = 1, rounding_point: int = 1) -> tuple:
+    """
+    Calculates usage, sugested production and packaging adjusted production numbers
+    for every product in one vectorized pass over the last N days of history.
+    Products without history in the window are left out, like on a new list.
+    Remaining defaults to zero for every product, also like on a new list, and otherwise
+    holds a value for every product in the catalog.
+    Returns a tuple of product ids, usage, production and adjusted production arrays
+    """
+    ids, portions_from_package, can_portion_partially, history_remaining, \
+        history_discarded, history_produced, counts = load_history(conn_string, days)
+    if remaining is None:
+        remaining = np.zeros(len(ids))
+
+    has_history = np.sum(counts, axis=-1) > 0
+    ids, portions_from_package, can_portion_partially = \
+        ids[has_history], portions_from_package[has_history], can_portion_partially[has_history]
+    remaining = np.asarray(remaining)[has_history]
+    usage = batch_usage(history_remaining[has_history], history_discarded[has_history],
+                        history_produced[has_history], rounding_point, counts[has_history])
+    production = batch_production(remaining, np.nan_to_num(usage), safety_margin, rounding_point)
+    adjusted = batch_adjust_for_packaging(production, can_portion_partially,
+                                          portions_from_package, rounding_point)
+
+    return ids, usage, production, adjusted
+
+
+def update_list_production(production_list: ProductionList, safety_margin: float = 1,
+                           rounding_point: int = 1) -> None:
+    """
+    Recalculates the production numbers of every row of a production list from its remaining
+    and average columns at once, adjusted for packaging. The columns are used in place, without copies
+    """
+    remaining = np.frombuffer(production_list.remaining, dtype=np.float64)
+    averages = np.frombuffer(production_list.averages, dtype=np.float64)
+    produced = np.frombuffer(production_list.produced, dtype=np.float64)
+    production = batch_production(remaining, averages, safety_margin, rounding_point)
+    produced[:] = batch_adjust_for_packaging(production,
+                                             np.frombuffer(production_list.can_portion_partially, dtype=np.int8),
+                                             np.frombuffer(production_list.portions_from_package, dtype=np.float64),
+                                             rounding_point)
+# CALCULATIONS
+
@@ -0,0 +1,1248 @@
+from collections import OrderedDict
+from datetime import date
+from PyQt6 import sip
+from PyQt6.QtCore import (
+    Qt, QAbstractTableModel, QModelIndex, QObject, QRunnable, QThreadPool, pyqtSignal
+)
+from PyQt6.QtWidgets import (
+    QApplication, QMainWindow, QWidget, QFrame, QScrollArea, QStackedWidget,
+    QSizePolicy, QTableView, QHeaderView, QAbstractItemView, QStyledItemDelegate,
+    QHBoxLayout, QVBoxLayout, QDateEdit, QLineEdit, QTextEdit,
+    QPushButton, QDoubleSpinBox, QCheckBox, QMessageBox, QLabel, QProgressBar
+)
+from core import (
+    CONNECTION_STRING,
+    ProductionDataModel, ProductModel, ProductionList,
+    calculate_production, adjust_for_packaging,
+    get_all_products, insert_product, delete_product, update_product, insert_production_data,
+    get_data_for_new_list, get_old_list, get_average_usage_by_product, get_product_instructions
+)
+
+PRODUCTION_LIST = ProductionList()
+DATABASE_WORKER = None
+# Highest number of portions the production list accepts for a single value
+MAXIMUM_PORTIONS = 9999.9
+# Widgets the cached pages may hold before the least recently shown ones are dropped.
+# Nearly all of a page's memory is in its widgets, so their count stands in for it
+MAX_PAGE_WIDGETS = 20000
+# Pages dropped only once no other page is left to drop, a catalog takes about 3 widgets
+# per product and rebuilding it is exactly what caching the pages avoids
+DROPPED_LAST = ("products",)
+
+# UI
+class MainWindow(QMainWindow):
+    """
+    The main window containing a sidebar with navigation controlls and a second widget
+    which serves as navigation.
+    Pages are kept in a stack once built, so returning to one shows it as it was left
+    """
+    def __init__(self) -> None:
+        super().__init__()
+        self.central_widget = QFrame()
+        self.base_layout = QHBoxLayout()
+        self.sidebar_layout = QVBoxLayout()
+
+        # Sidebar setup
+        self.current_list_button = QPushButton("CURRENT LIST")
+        self.current_list_button.setVisible(False)
+        self.new_list_button = QPushButton("START NEW LIST")
+        self.view_list_button = QPushButton("VIEW OLD LIST")
+        self.products_button = QPushButton("VIEW PRODUCTS")
+        self.new_product_button = QPushButton("NEW PRODUCT")
+        self.quit_button = QPushButton("QUIT")
+        self.sidebar_layout.addWidget(self.current_list_button)
+        self.sidebar_layout.addWidget(self.new_list_button)
+        self.sidebar_layout.addWidget(self.view_list_button)
+        self.sidebar_layout.addWidget(self.products_button)
+        self.sidebar_layout.addWidget(self.new_product_button)
+        self.sidebar_layout.addStretch()
+        self.sidebar_layout.addWidget(self.quit_button)
+
+        # Button functions setup
+        self.current_list_button.clicked.connect(self.on_current_list_button_clicked)
+        self.new_list_button.clicked.connect(self.on_new_list_button_clicked)
+        self.view_list_button.clicked.connect(self.on_view_list_button_clicked)
+        self.products_button.clicked.connect(self.on_products_button_clicked)
+        self.new_product_button.clicked.connect(self.on_new_product_button_clicked)
+        self.quit_button.clicked.connect(self.on_quit_button_clicked)
+
+        # Page setup, the first page is the empty one shown before anything is opened
+        self.pages = QStackedWidget()
+        self.pages.addWidget(QWidget())
+        self.pages.widgetRemoved.connect(self.on_page_removed)
+        # Built pages by name, the least recently shown first
+        self.cached_pages = OrderedDict()
+        # Counts the lists loaded so far, so a finished completion can tell if its list is still the current one
+        self.list_number = 0
+        self.list_completing = False
+
+        # Central widget setup
+        self.base_layout.setAlignment(Qt.AlignmentFlag.AlignLeft)
+        self.base_layout.addLayout(self.sidebar_layout)
+        self.base_layout.addWidget(self.pages)
+        self.central_widget.setLayout(self.base_layout)
+        self.setCentralWidget(self.central_widget)
+
+        # Status bar setup, shows progress while the database is busy
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 0)
+        self.progress_bar.setFixedWidth(150)
+        self.progress_bar.setVisible(False)
+        self.statusBar().addPermanentWidget(self.progress_bar)
+        get_database_worker().busy_changed.connect(self.on_database_busy_changed)
+
+
+    def show_page(self, name: str, create) -> QWidget:
+        """
+        Displays the page with the given name, building it with create if it isn't cached,
+        then drops the least recently shown pages while the cached ones hold too many widgets.
+        Pages in DROPPED_LAST are dropped after all the others
+        """
+        page = self.cached_pages.get(name)
+        if page is None:
+            page = create()
+            self.cached_pages[name] = page
+            self.pages.addWidget(page)
+        self.cached_pages.move_to_end(name)
+        self.pages.setCurrentWidget(page)
+
+        sizes = {cached: len(widget.findChildren(QWidget)) + 1 for cached, widget in self.cached_pages.items()}
+        total = sum(sizes.values())
+        # The page being shown is the last one and is never dropped
+        hidden = list(self.cached_pages)[:-1]
+        for cached in sorted(hidden, key=lambda cached: cached in DROPPED_LAST):
+            if total <= MAX_PAGE_WIDGETS:
+                break
+            total -= sizes[cached]
+            self.drop_page(cached)
+        return page
+
+
+    def drop_page(self, name: str) -> None:
+        """
+        Removes a cached page and releases its widgets.
+        If it was being shown the empty page is displayed instead
+        """
+        page = self.cached_pages.get(name)
+        if page is None:
+            return
+        self.pages.removeWidget(page)
+        page.deleteLater()
+
+
+    def on_page_removed(self, index: int) -> None:
+        """
+        Takes the pages that have left the stack out of the cache, i.e. a page that closed itself
+        once a product was created. If one was the page being shown the empty page is displayed instead
+        """
+        # The stack also removes its pages while the window is being destroyed
+        if sip.isdeleted(self.pages):
+            return
+        for name, page in list(self.cached_pages.items()):
+            if sip.isdeleted(page) or self.pages.indexOf(page) == -1:
+                if next(reversed(self.cached_pages)) == name:
+                    self.pages.setCurrentIndex(0)
+                del self.cached_pages[name]
+
+
+    def on_current_list_button_clicked(self) -> None:
+        """
+        Displays the current daily production list.
+        """
+        get_database_worker().cancel(self, "page")
+        self.current_list_button.setVisible(False)
+
+        self.show_page("current list", ListDisplayWidget)
+
+
+    def on_new_list_button_clicked(self) -> None:
+        """
+        Starts loading the data for a new list, which is displayed once it arrives
+        """
+        # If a list has been started already prompt the user wether to start a new one 
+        if len(PRODUCTION_LIST) != 0:
+            button = QMessageBox.question(self, "Start new list", 
+                                          "A list has been started already. Start a new one anyway?")
+
+            if button != QMessageBox.StandardButton.Yes:
+                return
+
+        # The current list is only replaced once the new one has loaded
+        get_database_worker().submit(self, "page", get_data_for_new_list, (CONNECTION_STRING, 30),
+                                     self.on_new_list_data_loaded, self.on_database_error)
+
+
+    def on_new_list_data_loaded(self, data: list) -> None:
+        """
+        Creates a new list from the loaded data and displays it using the List Display widget
+        """
+        PRODUCTION_LIST.load_new(data)
+        self.list_number += 1
+
+        # The page of the previous list may still be waiting for its averages
+        self.drop_page("current list")
+        self.show_page("current list", ListDisplayWidget)
+
+
+    def on_view_list_button_clicked(self) -> None:
+        """
+        Displays the List Display widget in a configuration
+        for browsing old lists.
+        """
+        get_database_worker().cancel(self, "page")
+        # If a new daily list has been created display the current list button
+        if len(PRODUCTION_LIST) > 0:
+            self.current_list_button.setVisible(True)
+
+        self.show_page("old list", lambda: ListDisplayWidget(old_list=True))
+
+
+    def on_products_button_clicked(self) -> None:
+        """
+        Displays the products page right away if it has been built before,
+        and starts fetching all products from the database to bring it up to date
+        """
+        # If a new daily list has been created display the current list button
+        if len(PRODUCTION_LIST) > 0:
+            self.current_list_button.setVisible(True)
+
+        if "products" in self.cached_pages:
+            self.show_page("products", None)
+        get_database_worker().submit(self, "page", get_all_products, (CONNECTION_STRING,),
+                                     self.on_products_loaded, self.on_database_error)
+
+
+    def on_products_loaded(self, data: list) -> None:
+        """
+        Displays the loaded products in the Products Display widget,
+        updating only the products that changed if the page is cached
+        """
+        self.show_page("products", lambda: ProductsDisplayWidget([])).update_products(data)
+
+
+    def on_new_product_button_clicked(self) -> None:
+        """
+        Displays the new product creation widget.
+        """
+        get_database_worker().cancel(self, "page")
+        if len(PRODUCTION_LIST) > 0:
+            self.current_list_button.setVisible(True)
+
+        self.show_page("new product", lambda: AddProductWidget(ProductModel()))
+
+
+    def on_quit_button_clicked(self) -> None:
+        """
+        Exits the application
+        """
+        # If there is a new list open prompt the user to make sure they don't lose it
+        if len(PRODUCTION_LIST) > 0:
+            button = QMessageBox.question(self, "Quit application", 
+                                          "Current production list not finished. Quit anyway?")
+
+            if button == QMessageBox.StandardButton.Yes:
+                pass
+            else:
+                return
+
+        QApplication.quit()
+
+
+    def complete_list(self) -> None:
+        """
+        Starts writing the current list to the database. No new list can be started until it is written,
+        it would be averaged without today's data
+        """
+        if self.list_completing:
+            return
+        list_number = self.list_number
+        self.set_list_completing(True)
+        # The write belongs to the main window, so navigating away doesn't drop its result
+        get_database_worker().submit(self, "complete list", insert_production_data,
+                                     (CONNECTION_STRING, PRODUCTION_LIST.to_tuples()),
+                                     lambda result: self.on_list_completed(list_number),
+                                     self.on_list_completion_failed)
+
+
+    def set_list_completing(self, completing: bool) -> None:
+        """
+        Disables starting or completing a list while the current one is being written
+        """
+        self.list_completing = completing
+        self.new_list_button.setEnabled(not completing)
+        page = self.cached_pages.get("current list")
+        if page is not None:
+            page.complete_list_button.setEnabled(not completing)
+
+
+    def on_list_completed(self, list_number: int) -> None:
+        """
+        Once the current list has been written to the database, drops it
+        along with its page, unless another list has been loaded since
+        """
+        self.set_list_completing(False)
+        if list_number != self.list_number:
+            return
+        PRODUCTION_LIST.clear()
+        self.current_list_button.setVisible(False)
+
+        self.drop_page("current list")
+
+
+    def on_list_completion_failed(self, error: Exception) -> None:
+        """
+        Informs the user that the list could not be saved and allows them to try again
+        """
+        self.set_list_completing(False)
+
+        self.on_database_error(error)
+
+
+    def on_database_error(self, error: Exception) -> None:
+        """
+        Informs the user about a failed database operation
+        """
+        button = QMessageBox.information(self, "Database error", f"{error}")
+
+
+    def on_database_busy_changed(self, busy: bool) -> None:
+        """
+        Shows the progress bar while database operations are running
+        """
+        self.progress_bar.setVisible(busy)
+
+
+class ListDisplayWidget(QFrame):
+    """
+    A widget that displays a production list along with relevant controlls
+    """
+    def __init__(self, old_list: bool=False, data_list: ProductionList=PRODUCTION_LIST) -> None:
+        super().__init__()
+        self.old_list = old_list
+        self.base_layout = QVBoxLayout()
+        self.top_bar_layout = QHBoxLayout()
+        self.bottom_bar_layout = QHBoxLayout()
+
+        # Top bar setup
+        self.suggest_label = QLabel("SUGGESTED PRODUCTION AVERAGE:")
+        if old_list == False:
+            self.suggest_label.setText("SUGGESTED PRODUCTION AVERAGE:")
+        else:
+            self.suggest_label.setText("SHOWING PRODUCTION LIST FOR:")
+        self.monthly_button = QPushButton("MONTHLY")
+        self.biweekly_button = QPushButton("BIWEEKLY")
+        self.weekly_button = QPushButton("WEEKLY")
+        self.yesterday_button = QPushButton("YESTERDAY")
+        self.date_picker = QDateEdit()
+        self.go_button = QPushButton("GO")
+        self.date_picker.setFixedWidth(150)
+        self.date_picker.setDate(date.today())
+        self.date_picker.setCalendarPopup(True)
+        self.top_bar_layout.addWidget(self.suggest_label)
+        self.top_bar_layout.addStretch()
+        if old_list == False:
+            self.top_bar_layout.addWidget(self.monthly_button)
+            self.top_bar_layout.addWidget(self.biweekly_button)
+            self.top_bar_layout.addWidget(self.weekly_button)
+            self.top_bar_layout.addWidget(self.yesterday_button)
+        else:
+            self.top_bar_layout.addWidget(self.date_picker)
+            self.top_bar_layout.addWidget(self.go_button)
+        # Top bar button event handling
+        self.monthly_button.clicked.connect(self.on_monthly_button_clicked)
+        self.biweekly_button.clicked.connect(self.on_biweekly_button_clicked)
+        self.weekly_button.clicked.connect(self.on_weekly_button_clicked)
+        self.yesterday_button.clicked.connect(self.on_yesterday_button_clicked)
+        self.go_button.clicked.connect(self.on_go_button_clicked)
+        
+        # Production list setup
+        # Rows are painted straight from the models, editors only exist while a cell is edited
+        self.list_model = ProductionListModel([] if old_list else data_list, old_list=old_list)
+        self.list_view = QTableView()
+        self.list_view.setModel(self.list_model)
+        self.list_view.setItemDelegate(ProductionValueDelegate(self.list_view))
+        self.list_view.setEditTriggers(QAbstractItemView.EditTrigger.AllEditTriggers)
+        self.list_view.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.list_view.verticalHeader().setVisible(False)
+        self.list_view.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.list_view.verticalHeader().setDefaultSectionSize(40)
+        self.list_view.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.list_view.horizontalHeader().setSectionResizeMode(ProductionListModel.NAME_COLUMN,
+                                                               QHeaderView.ResizeMode.Stretch)
+        self.list_view.setColumnWidth(ProductionListModel.INSTRUCTIONS_COLUMN, 30)
+        self.list_view.setColumnWidth(ProductionListModel.REMAINING_COLUMN, 115)
+        self.list_view.setColumnWidth(ProductionListModel.DISCARDED_COLUMN, 115)
+        self.list_view.setColumnWidth(ProductionListModel.PRODUCED_COLUMN, 115)
+        self.list_view.setColumnWidth(ProductionListModel.COMPLETED_COLUMN, 30)
+        self.list_view.setColumnHidden(ProductionListModel.INSTRUCTIONS_COLUMN, old_list)
+        self.list_view.setColumnHidden(ProductionListModel.COMPLETED_COLUMN, old_list)
+        self.list_view.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOn)
+        self.list_view.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.list_view.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        self.list_view.clicked.connect(self.on_list_item_clicked)
+        self.empty_label = QLabel()
+        self.empty_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.empty_label.setHidden(True)
+
+        # Bottom bar layout
+        self.complete_list_button = QPushButton("COMPLETE LIST")
+        self.bottom_bar_layout.addStretch()
+        self.bottom_bar_layout.addWidget(self.complete_list_button)
+        self.bottom_bar_layout.addStretch()
+        # Bottom bar button event handling
+        self.complete_list_button.clicked.connect(self.on_complete_list_button_clicked)
+
+        self.base_layout.addLayout(self.top_bar_layout)
+        self.base_layout.addWidget(self.list_view)
+        self.base_layout.addWidget(self.empty_label)
+        if old_list == False:
+            self.base_layout.addLayout(self.bottom_bar_layout)
+        self.setLayout(self.base_layout)
+
+
+    def on_weekly_button_clicked(self) -> None:
+        """
+        Adjusts the production numbers to the average usage of the last 7 days
+        """
+        self.apply_window(7, "a weekly average")
+
+
+    def on_biweekly_button_clicked(self) -> None:
+        """
+        Adjusts the production numbers to the average usage of the last 14 days
+        """
+        self.apply_window(14, "a biweekly average")
+
+    
+    def on_monthly_button_clicked(self) -> None:
+        """
+        Adjusts the production numbers to the average usage of the last 30 days
+        """
+        self.apply_window(30, "a monthly average")
+
+
+    def on_yesterday_button_clicked(self) -> None:
+        """
+        Adjusts the production numbers to the average usage of the last day
+        """
+        self.apply_window(1, "yesterday's average")
+
+
+    def apply_window(self, days: int, description: str) -> None:
+        """
+        Asks wether to adjust the production numbers to the average usage of the last N days.
+        If so, starts fetching it from the database, the list is updated once it arrives
+        """
+        button = QMessageBox.question(self, "Adjust production numbers", 
+                                          f"Do you want to adjust production numbers to {description}?")
+        if button == QMessageBox.StandardButton.Yes:
+            pass
+        else:
+            return
+        
+        get_database_worker().submit(self, "average", get_average_usage_by_product, (CONNECTION_STRING, days),
+                                     self.on_average_usage_loaded, self.on_database_error)
+
+
+    def on_complete_list_button_clicked(self) -> None:
+        """
+        Prompts the user wether or not they want to complete the list
+        If so, checks that all models have their completed value set to true
+        before writing the new production data to the database
+        """
+        if not all(PRODUCTION_LIST.completed):
+            button = QMessageBox.critical(self, "Cannot complete list", 
+                                             "List cannot be completed untill all items have been checked off")
+            return
+            
+        button = QMessageBox.question(self, "Complete list", 
+                                          "Are you sure you want complete the production list?")
+        if button == QMessageBox.StandardButton.Yes:
+            pass
+        else:
+            return
+        
+        self.window().complete_list()
+
+
+    def on_average_usage_loaded(self, data: dict) -> None:
+        """
+        Updates the displayed numbers and the model with the loaded usage data
+        """
+        self.list_model.apply_averages(data)
+
+
+    def on_go_button_clicked(self) -> None:
+        """
+        If an old list is displayed, starts fetching the relevant production data from the databse
+        """
+        get_database_worker().submit(self, "old list", get_old_list,
+                                     (CONNECTION_STRING, self.date_picker.date().toPyDate()),
+                                     self.on_old_list_loaded, self.on_database_error)
+
+
+    def on_old_list_loaded(self, data: list) -> None:
+        """
+        Displays the loaded production data of an old list.
+        If there is no data, displays a message instead of the list
+        """
+        model_list = []
+        for d in data:
+            data_model = ProductionDataModel()
+            data_model.from_tuple_old(d)
+            model_list.append(data_model)
+        self.list_model.set_data_list(model_list)
+
+        self.empty_label.setText(f"THERE IS NO PRODUCTION DATA FOR {self.date_picker.date().toPyDate()}")
+        self.empty_label.setHidden(len(model_list) > 0)
+        self.list_view.setHidden(len(model_list) == 0)
+
+
+    def on_database_error(self, error: Exception) -> None:
+        """
+        Informs the user about a failed database operation
+        """
+        button = QMessageBox.information(self, "Database error", f"{error}")
+
+
+    def on_list_item_clicked(self, index: QModelIndex) -> None:
+        """
+        Starts fetching the instructions for portioning the product when its "?" cell is clicked,
+        they are displayed in a pop-up once they arrive
+        """
+        if index.column() == ProductionListModel.INSTRUCTIONS_COLUMN:
+            model = self.list_model.data_list[index.row()]
+            get_database_worker().submit(self, "instructions", get_product_instructions,
+                                         (CONNECTION_STRING, model.id),
+                                         self.on_instructions_loaded, self.on_database_error)
+
+
+    def on_instructions_loaded(self, instructions: str) -> None:
+        """
+        Displays a pop-up with the loaded instructions
+        """
+        button = QMessageBox.information(self, "Preparation instructions", instructions or "")
+
+
+class ProductionListModel(QAbstractTableModel):
+    """
+    A table model that exposes a ProductionList or a list of ProductionDataModels to a QTableView,
+    along with the recalculation of "produced" when "remaining" changes
+    """
+    INSTRUCTIONS_COLUMN = 0
+    NAME_COLUMN = 1
+    REMAINING_COLUMN = 2
+    DISCARDED_COLUMN = 3
+    PRODUCED_COLUMN = 4
+    COMPLETED_COLUMN = 5
+    VALUE_COLUMNS = (REMAINING_COLUMN, DISCARDED_COLUMN, PRODUCED_COLUMN)
+    HEADERS = ("", "NAME:", "REMAINING:", "DISCARDED:", "PRODUCED:", "")
+
+    def __init__(self, data_list: list, old_list: bool = False) -> None:
+        super().__init__()
+        self.data_list = data_list
+        self.old_list = old_list
+
+
+    def set_data_list(self, data_list: list) -> None:
+        """
+        Replaces the displayed list of models
+        """
+        self.beginResetModel()
+        self.data_list = data_list
+        self.endResetModel()
+
+
+    def apply_averages(self, averages: dict) -> None:
+        """
+        Sets the averages of the products in a dictionary keyed by product ID and
+        their "produced" values to the average minus what remains.
+        Products without an average are left as they are. The columns are updated directly
+        and the view is told about the change once, so it repaints once for the whole list
+        """
+        production_list = self.data_list
+        for product_id, average in averages.items():
+            row = production_list.row_of(product_id)
+            if row is None:
+                continue
+            production_list.averages[row] = average
+            value = average - production_list.remaining[row]
+            production_list.produced[row] = round(min(max(value, 0), MAXIMUM_PORTIONS), 1)
+
+        if len(production_list) > 0:
+            self.dataChanged.emit(self.index(0, self.PRODUCED_COLUMN),
+                                  self.index(len(production_list) - 1, self.PRODUCED_COLUMN))
+
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.data_list)
+
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+
+    def headerData(self, section: int, orientation: Qt.Orientation,
+                   role: int = Qt.ItemDataRole.DisplayRole) -> object:
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> object:
+        """
+        Returns the value of a cell for the view, reading it straight from the model
+        """
+        if not index.isValid():
+            return None
+        model = self.data_list[index.row()]
+        column = index.column()
+
+        if role == Qt.ItemDataRole.DisplayRole or role == Qt.ItemDataRole.EditRole:
+            if column == self.INSTRUCTIONS_COLUMN:
+                return "?"
+            if column == self.NAME_COLUMN:
+                return model.name
+            if column in self.VALUE_COLUMNS:
+                value = (model.remaining, model.discarded, model.produced)[column - self.REMAINING_COLUMN]
+                return value if role == Qt.ItemDataRole.EditRole else f"{value:.1f}"
+        elif role == Qt.ItemDataRole.CheckStateRole and column == self.COMPLETED_COLUMN:
+            return Qt.CheckState.Checked if model.completed else Qt.CheckState.Unchecked
+        elif role == Qt.ItemDataRole.TextAlignmentRole and column != self.NAME_COLUMN:
+            return Qt.AlignmentFlag.AlignCenter
+        return None
+
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlag:
+        """
+        Values can be edited on a new list until the product is marked as completed
+        """
+        if self.old_list:
+            return Qt.ItemFlag.ItemIsEnabled
+        column = index.column()
+        if column == self.COMPLETED_COLUMN:
+            return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsUserCheckable
+        if column in self.VALUE_COLUMNS:
+            if self.data_list[index.row()].completed:
+                return Qt.ItemFlag.NoItemFlags
+            return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsEditable
+        return Qt.ItemFlag.ItemIsEnabled
+
+
+    def setData(self, index: QModelIndex, value: object, role: int = Qt.ItemDataRole.EditRole) -> bool:
+        """
+        Updates the model from an edited cell.
+        When "remaining" changes, corrects the "produced" value as well.
+        Only the cells changed as a side effect are reported, the edited cell is repainted by its view
+        """
+        model = self.data_list[index.row()]
+        column = index.column()
+
+        if role == Qt.ItemDataRole.CheckStateRole and column == self.COMPLETED_COLUMN:
+            completed = Qt.CheckState(value) == Qt.CheckState.Checked
+            if completed != model.completed:
+                model.completed = completed
+                # Completing a product locks its values, so the whole row changes
+                self.dataChanged.emit(self.index(index.row(), 0), self.index(index.row(), len(self.HEADERS) - 1))
+        elif role == Qt.ItemDataRole.EditRole and column in self.VALUE_COLUMNS:
+            value = round(min(max(float(value), 0), MAXIMUM_PORTIONS), 1)
+            if column == self.REMAINING_COLUMN:
+                new_value = calculate_production(value, model.average)
+                produced = adjust_for_packaging(new_value, model.can_portion_partially,
+                                                model.portions_from_package)
+                model.remaining = value
+                if produced != model.produced:
+                    model.produced = produced
+                    produced_index = self.index(index.row(), self.PRODUCED_COLUMN)
+                    self.dataChanged.emit(produced_index, produced_index)
+            elif column == self.DISCARDED_COLUMN:
+                model.discarded = value
+            else:
+                model.produced = value
+        else:
+            return False
+
+        return True
+
+
+class ProductionValueDelegate(QStyledItemDelegate):
+    """
+    Edits the remaining, discarded and produced cells of the production list with a spin box.
+    An editor only exists while its cell is being edited
+    """
+    def createEditor(self, parent: QWidget, option: object, index: QModelIndex) -> QWidget:
+        model = index.model().data_list[index.row()]
+        editor = QDoubleSpinBox(parent)
+        editor.setDecimals(1)
+        editor.setMaximum(MAXIMUM_PORTIONS)
+        if index.column() == ProductionListModel.PRODUCED_COLUMN and model.can_portion_partially == False:
+            editor.setSingleStep(model.portions_from_package)
+        else:
+            editor.setSingleStep(0.1)
+        # The value is committed once editing finishes, "produced" is recalculated by the model then
+        return editor
+
+
+    def setEditorData(self, editor: QWidget, index: QModelIndex) -> None:
+        editor.blockSignals(True)
+        editor.setValue(index.data(Qt.ItemDataRole.EditRole))
+        editor.blockSignals(False)
+
+
+    def setModelData(self, editor: QWidget, model: QAbstractTableModel, index: QModelIndex) -> None:
+        model.setData(index, editor.value(), Qt.ItemDataRole.EditRole)
+
+
+class ProductsDisplayWidget(QFrame):
+    """
+    Displays a list of widgets for every product in the database
+    """
+    def __init__(self, model_list: list) -> None:
+        super().__init__()
+        self.base_layout = QHBoxLayout()
+        self.list_box = QScrollArea()
+        self.list_box_layout = QVBoxLayout()
+        
+        # Set up product list 
+        self.container = QWidget()
+        for model in model_list:
+            self.list_box_layout.addWidget(ProductDataWidget(model))
+        self.list_box_layout.setAlignment(Qt.AlignmentFlag.AlignTop)
+        self.container.setLayout(self.list_box_layout)
+        self.container.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        self.list_box.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOn)
+        self.list_box.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.list_box.setWidgetResizable(True)
+        self.list_box.setWidget(self.container)
+
+        self.base_layout.addWidget(self.list_box)
+        self.setLayout(self.base_layout)
+
+
+    def update_products(self, data: list) -> None:
+        """
+        Brings the displayed products in line with the loaded catalog. Widgets of removed products
+        are deleted, changed products are updated in place and new ones are added in catalog order.
+        Products with their details shown keep what is being viewed or edited
+        """
+        ids = {d[0] for d in data}
+        widgets = {}
+        for widget in [self.list_box_layout.itemAt(n).widget() for n in range(self.list_box_layout.count())]:
+            if widget.model.id in ids:
+                widgets[widget.model.id] = widget
+            else:
+                self.list_box_layout.removeWidget(widget)
+                widget.deleteLater()
+
+        for n, d in enumerate(data):
+            widget = widgets.get(d[0])
+            if widget is None:
+                model = ProductModel()
+                model.from_tuple(d)
+                self.list_box_layout.insertWidget(n, ProductDataWidget(model))
+            elif widget.details is None and widget.model.to_tuple()[0:5] != tuple(d):
+                widget.model.from_tuple(d)
+                widget.name_edit.setText(widget.model.name)
+
+
+class ProductDataWidget(QFrame):
+    """
+    A widget that displays the details of a single product from the database
+    Contains controlls for editing, updating and deleting
+    """
+    def __init__(self, model: ProductModel) -> None:
+        super().__init__()
+        self.base_layout = QVBoxLayout()
+        self.top_bar = QHBoxLayout()
+        self.model = model
+        # The details section and the backup model only exist while the details are shown
+        self.details = None
+        self.backup_model = None
+
+        # Top bar setup
+        self.name_edit = QLineEdit(f"{self.model.name}")
+        self.name_edit.setEnabled(False)
+        self.details_button = QPushButton("DETAILS")
+        self.details_button.setCheckable(True)
+        self.top_bar.addWidget(self.name_edit)
+        self.top_bar.addStretch()
+        self.top_bar.addWidget(self.details_button)
+        # Button event handler setup
+        self.details_button.clicked.connect(self.on_details_button_clicked)
+        self.name_edit.textChanged.connect(self.on_name_changed)
+
+        self.base_layout.addLayout(self.top_bar)
+        self.setLayout(self.base_layout)
+
+
+    def show_details(self) -> None:
+        """
+        Builds the details section for the product along with a backup of the model.
+        The instructions are fetched first if the catalog hasn't loaded them yet
+        """
+        if self.model.instructions is None:
+            get_database_worker().submit(self, "instructions", get_product_instructions,
+                                         (CONNECTION_STRING, self.model.id),
+                                         self.on_instructions_loaded, self.on_instructions_failed)
+            return
+
+        self.backup_model = ProductModel()
+        self.backup_model.from_tuple(self.model.to_tuple())
+        self.details = ProductDetailsWidget(self.model)
+
+        # Hide editing controlls unless editing is allowed
+        self.set_edit_enabled()
+
+        # Event binding
+        self.details.edit_checkbox.checkStateChanged.connect(self.set_edit_enabled)
+        self.details.save_button.clicked.connect(self.on_save_button_pressed)
+        self.details.delete_button.clicked.connect(self.on_delete_button_pressed)
+        self.details.package_name_edit.textChanged.connect(self.on_package_name_changed)
+        self.details.portions_double_box.valueChanged.connect(self.on_portions_from_package_changed)
+        self.details.partial_checkbox.checkStateChanged.connect(self.on_can_portion_partially_changed)
+        self.details.instructions_edit.textChanged.connect(self.on_instructions_changed)
+
+        self.base_layout.addWidget(self.details)
+
+
+    def on_instructions_loaded(self, instructions: str) -> None:
+        """
+        Stores the loaded instructions in the model and shows the details, unless they were toggled off meanwhile
+        """
+        self.model.instructions = instructions or ""
+        if self.details_button.isChecked() and self.details is None:
+            self.show_details()
+
+
+    def on_instructions_failed(self, error: Exception) -> None:
+        """
+        Informs the user that the instructions couldn't be loaded and toggles the details off
+        """
+        self.details_button.setChecked(False)
+        button = QMessageBox.information(self, "Database error", f"{error}")
+
+
+    def hide_details(self) -> None:
+        """
+        Removes the details section, reverting unsaved changes, and releases its widgets
+        """
+        if self.details is None:
+            get_database_worker().cancel(self, "instructions")
+            return
+        if self.details.edit_checkbox.isChecked():
+            self.details.edit_checkbox.setChecked(False)
+
+        self.base_layout.removeWidget(self.details)
+        self.details.deleteLater()
+        self.details = None
+        self.backup_model = None
+
+
+    def set_edit_enabled(self) -> None:
+        """
+        When the edit checkbox is clicked, enables or disables editing fields.
+        When editing is disabled the values are reset using the backup model
+        """
+        enabled = self.details.edit_checkbox.isChecked()
+        self.name_edit.setEnabled(enabled)
+        self.details.package_name_edit.setEnabled(enabled)
+        self.details.portions_double_box.setEnabled(enabled)
+        self.details.partial_checkbox.setEnabled(enabled)
+        self.details.instructions_edit.setEnabled(enabled)
+        self.details.save_button.setVisible(enabled)
+        self.details.delete_button.setVisible(enabled)
+
+        if enabled == False:
+            self.model.from_tuple(self.backup_model.to_tuple())
+            self.name_edit.setText(self.model.name)
+            self.details.package_name_edit.setText(self.model.package_name)
+            self.details.portions_double_box.setValue(self.model.portions_from_package)
+            self.details.partial_checkbox.setChecked(self.model.can_portion_partially)
+            self.details.instructions_edit.setText(self.model.instructions)
+
+
+    def on_details_button_clicked(self) -> None:
+        """
+        Togles the details on and off.
+        When togled off, editing is also disabled
+        """
+        if self.details_button.isChecked() == True:
+            self.show_details()
+        else:
+            self.hide_details()
+
+
+    def on_save_button_pressed(self) -> None:
+        """
+        Prompts the user to confirm their choice to save
+        If confirmed, updates the product details in the database and the backup model
+        """
+        button = QMessageBox.question(self, "Save changes", 
+                                          "Are you sure you want to save the changes you made?")
+        if button == QMessageBox.StandardButton.Yes:
+            pass
+        else:
+            return
+        
+        try:
+            update_product(CONNECTION_STRING, self.model.to_tuple_update(), self.model.id)
+        except Exception as error:
+            button = QMessageBox.information(self,f"{error}")
+            return
+        
+        self.backup_model.from_tuple(self.model.to_tuple())
+
+
+    def on_delete_button_pressed(self) -> None:
+        """
+        Prompts the user to confirm their choice to delete
+        If confirmed, deletes the product from the database and removes the widget
+        """
+        button = QMessageBox.question(self, "Delete product", 
+                                          "Are you sure you want to delete this product?")
+        if button == QMessageBox.StandardButton.Yes:
+            pass
+        else:
+            return
+        
+        try:
+            delete_product(CONNECTION_STRING, self.model.id)
+        except Exception as error:
+            button = QMessageBox.information(self,f"{error}")
+            return
+        
+        self.deleteLater()
+
+
+    def on_name_changed(self) -> None:
+        """
+        Updates the name in the model
+        """
+        self.model.name = self.name_edit.text()    
+
+    
+    def on_package_name_changed(self) -> None:
+        """
+        Updates the package name in the model
+        """
+        self.model.package_name = self.details.package_name_edit.text()
+
+    
+    def on_portions_from_package_changed(self) -> None:
+        """
+        Updates the number of portions from one package in the model
+        """
+        self.model.portions_from_package = round(self.details.portions_double_box.value(), 1)
+
+
+    def on_can_portion_partially_changed(self) -> None:
+        """
+        Updates wether or not the product can be portioned partially in the model
+        """
+        self.model.can_portion_partially = self.details.partial_checkbox.isChecked()
+
+
+    def on_instructions_changed(self) -> None:
+        """
+        Updates the instructions in the model
+        """
+        self.model.instructions = self.details.instructions_edit.toPlainText()
+
+
+class ProductDetailsWidget(QWidget):
+    """
+    The details section of a ProductDataWidget with the packaging, portioning
+    and instructions editors. Only created while the details are shown
+    """
+    def __init__(self, model: ProductModel) -> None:
+        super().__init__()
+        self.bottom_bar = QHBoxLayout()
+        self.left_section = QVBoxLayout()
+        self.package_bar = QHBoxLayout()
+        self.package_label = QLabel("PACKAGING NAME:")
+        self.package_name_edit = QLineEdit(f"{model.package_name}")
+        self.portions_bar = QHBoxLayout()
+        self.portions_label = QLabel("PORTIONS IN PACKAGE:")
+        self.portions_double_box = QDoubleSpinBox()
+        self.portions_double_box.setValue(model.portions_from_package)
+        self.partial_bar = QHBoxLayout()
+        self.partial_label = QLabel("CAN BE PORTIONED PARTIALY:")
+        self.partial_checkbox = QCheckBox()
+        self.partial_checkbox.setChecked(model.can_portion_partially)
+        self.right_section = QVBoxLayout()
+        self.instructions_label = QLabel("INSTRUCTIONS:")
+        self.instructions_edit = QTextEdit(f"{model.instructions}")
+        self.edit_bar = QHBoxLayout()
+        self.edit_label = QLabel("ALLOW EDITING")
+        self.edit_checkbox = QCheckBox()
+        self.save_button = QPushButton("SAVE")
+        self.delete_button = QPushButton("DELETE")
+
+        # Combining elements to build the interface
+        self.package_bar.addWidget(self.package_label)
+        self.package_bar.addWidget(self.package_name_edit)
+        self.portions_bar.addWidget(self.portions_label)
+        self.portions_bar.addWidget(self.portions_double_box)
+        self.partial_bar.addWidget(self.partial_label)
+        self.partial_bar.addWidget(self.partial_checkbox)
+        self.edit_bar.addWidget(self.edit_label)
+        self.edit_bar.addWidget(self.edit_checkbox)
+        self.edit_bar.addStretch()
+        self.edit_bar.addWidget(self.save_button)
+        self.edit_bar.addWidget(self.delete_button)
+        self.left_section.addLayout(self.package_bar)
+        self.left_section.addLayout(self.portions_bar)
+        self.left_section.addLayout(self.partial_bar)
+        self.left_section.addStretch()
+        self.left_section.addLayout(self.edit_bar)
+        self.left_section.setAlignment(Qt.AlignmentFlag.AlignTop)
+        self.right_section.addWidget(self.instructions_label)
+        self.right_section.addWidget(self.instructions_edit)
+        self.right_section.setAlignment(Qt.AlignmentFlag.AlignTop)
+        self.bottom_bar.addLayout(self.left_section)
+        self.bottom_bar.addLayout(self.right_section)
+        self.setLayout(self.bottom_bar)
+
+
+class AddProductWidget(QFrame):
+    """
+    A widget for creating new products with relevant controls for 
+    field editing and writing to the database
+    """
+    def __init__(self, model: ProductModel) -> None:
+        super().__init__()
+        self.base_layout = QVBoxLayout()
+        self.name_label = QLabel("PRODUCT NAME:")
+        self.name_field = QLineEdit("NAME")
+        self.package_label = QLabel("PACKAGE NAME:")
+        self.package_field = QLineEdit("PACKAGE")
+        self.portions_label = QLabel("PORTIONS CONTAINED IN PACKAGE:")
+        self.portions_field = QDoubleSpinBox()
+        self.partial_layout = QHBoxLayout()
+        self.partial_label = QLabel("CAN BE PORTIONED PARTIALLY:")
+        self.partial_field = QCheckBox()
+        self.instructions_label = QLabel("PORTIONING INSTRUCTIONS:")
+        self.instructions_field = QTextEdit("INSTRUCTIONS")
+        self.create_button = QPushButton("CREATE")
+        self.model = model
+
+        self.base_layout.addWidget(self.name_label)
+        self.base_layout.addWidget(self.name_field)
+        self.base_layout.addWidget(self.package_label)
+        self.base_layout.addWidget(self.package_field)
+        self.base_layout.addWidget(self.portions_label)
+        self.base_layout.addWidget(self.portions_field)
+        self.partial_layout.addWidget(self.partial_label)
+        self.partial_layout.addWidget(self.partial_field)
+        self.base_layout.addLayout(self.partial_layout)
+        self.base_layout.addWidget(self.instructions_label)
+        self.base_layout.addWidget(self.instructions_field)
+        self.base_layout.addWidget(self.create_button)
+
+        self.name_field.textChanged.connect(self.on_name_value_changed)
+        self.package_field.textChanged.connect(self.on_package_value_changed)
+        self.portions_field.valueChanged.connect(self.on_portions_value_changed)
+        self.partial_field.checkStateChanged.connect(self.on_partial_value_changed)
+        self.instructions_field.textChanged.connect(self.on_instructions_value_changed)
+        self.create_button.clicked.connect(self.on_create_button_clicked)
+
+        self.hlayout = QHBoxLayout()
+        self.hlayout.addStretch()
+        self.hlayout.addLayout(self.base_layout)
+        self.hlayout.addStretch()
+        self.setLayout(self.hlayout)
+
+
+    def on_name_value_changed(self) -> None:
+        """
+        Updates the model value for name
+        """
+        self.model.name =self.name_field.text()
+
+
+    def on_package_value_changed(self) -> None:
+        """
+        Updates the model value for package name
+        """
+        self.model.package_name = self.package_field.text()
+    
+    
+    def on_portions_value_changed(self) -> None:
+        """
+        Updates the model value for portions from package
+        """
+        self.model.portions_from_package = self.portions_field.value()
+
+        
+    def on_partial_value_changed(self) -> None:
+        """
+        Updates the model value for partial portioning
+        """
+        self.model.can_portion_partially = self.partial_field.isChecked()
+
+
+    def on_instructions_value_changed(self) -> None:
+        """
+        Updates the model value for portioning instructions
+        """
+        self.model.instructions = self.instructions_field.toPlainText()
+
+
+    def on_create_button_clicked(self) -> None:
+        """
+        Prompts the user to confirm the creation
+        and writes the ne product to the database
+        """
+        button = QMessageBox.question(self, "Create new product", 
+                                          "Are you sure you want add this product to the database?")
+        if button == QMessageBox.StandardButton.Yes:
+            pass
+        else:
+            return
+
+        try:
+            insert_product(CONNECTION_STRING, self.model.to_tuple_update())
+        except Exception as error:
+            button = QMessageBox.information(self,f"{error}")
+            return
+        
+        self.deleteLater()
+
+
+class DatabaseTaskSignals(QObject):
+    """
+    Signals a database task uses to hand its result back to the GUI thread
+    """
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+
+
+class DatabaseTask(QRunnable):
+    """
+    Runs a single DB OPS function on a worker thread
+    """
+    def __init__(self, function, args: tuple) -> None:
+        super().__init__()
+        self.function = function
+        self.args = args
+        self.signals = DatabaseTaskSignals()
+
+
+    def run(self) -> None:
+        try:
+            result = self.function(*self.args)
+        except Exception as error:
+            self.signals.failed.emit(error)
+            return
+
+        self.signals.finished.emit(result)
+
+
+class DatabaseWorker(QObject):
+    """
+    Runs database operations on a thread pool so the GUI stays responsive.
+    Every task belongs to an owner widget and a key. Submitting a new task with the same
+    owner and key cancels the stale one, as does the owner being destroyed.
+    Cancelled tasks still finish on their thread, but their results are dropped
+    """
+    busy_changed = pyqtSignal(bool)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.pool = QThreadPool(self)
+        # Threads are kept rather than expiring when idle, every one of them holds
+        # its own database connections, which are only closed along with the thread
+        self.pool.setExpiryTimeout(-1)
+        self.tasks = {}
+        self.watched_owners = set()
+
+
+    def submit(self, owner: QObject, key: str, function, args: tuple,
+               on_finished, on_failed) -> DatabaseTask:
+        """
+        Queues a database function, its result or error is passed to the callbacks
+        on the GUI thread unless the task gets cancelled first
+        """
+        self.cancel(owner, key)
+
+        task = DatabaseTask(function, args)
+        task.signals.finished.connect(lambda result: self.deliver(task, on_finished, result))
+        task.signals.failed.connect(lambda error: self.deliver(task, on_failed, error))
+        self.tasks[task] = (id(owner), key)
+
+        if id(owner) not in self.watched_owners:
+            self.watched_owners.add(id(owner))
+            owner_id = id(owner)
+            owner.destroyed.connect(lambda: self.cancel_owner(owner_id))
+
+        if len(self.tasks) == 1:
+            self.busy_changed.emit(True)
+        self.pool.start(task)
+        return task
+
+
+    def deliver(self, task: DatabaseTask, callback, value: object) -> None:
+        """
+        Passes the outcome of a task to its callback, unless the task was cancelled
+        """
+        if self.tasks.pop(task, None) is None:
+            return
+        if len(self.tasks) == 0:
+            self.busy_changed.emit(False)
+        callback(value)
+
+
+    def cancel(self, owner: QObject, key: str) -> None:
+        """
+        Cancels the pending task of the owner with the given key
+        """
+        self.remove_tasks(lambda task_owner, task_key: task_owner == id(owner) and task_key == key)
+
+
+    def cancel_owner(self, owner_id: int) -> None:
+        """
+        Cancels every pending task of a destroyed owner
+        """
+        self.watched_owners.discard(owner_id)
+        self.remove_tasks(lambda task_owner, task_key: task_owner == owner_id)
+
+
+    def remove_tasks(self, condition) -> None:
+        """
+        Drops the tasks matching the condition, taking them off the queue if they haven't started
+        """
+        stale = [task for task, (owner, key) in self.tasks.items() if condition(owner, key)]
+        if len(stale) == 0:
+            return
+
+        for task in stale:
+            # The pool deletes a task once it has run, even while its result is still on the way
+            if not sip.isdeleted(task):
+                self.pool.tryTake(task)
+            del self.tasks[task]
+        if len(self.tasks) == 0:
+            self.busy_changed.emit(False)
+
+
+def get_database_worker() -> DatabaseWorker:
+    """
+    Returns the application's database worker, creating it on first use
+    and again if it was destroyed along with an earlier application
+    """
+    global DATABASE_WORKER
+    if DATABASE_WORKER is None or sip.isdeleted(DATABASE_WORKER):
+        DATABASE_WORKER = DatabaseWorker()
+    return DATABASE_WORKER
+# UI
+
+
+def run() -> None:
+    """
+    Starts the application window and blocks until it is closed
+    """
+    app = QApplication([])
+    main_window = MainWindow()
+    main_window.setMinimumSize(800, 500)
+    main_window.show()
+    app.exec()
+    get_database_worker().pool.waitForDone()
@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is left out there
+    resource = None
+from benchmark import find_regressions, REGRESSION_THRESHOLD
+
+# Number of products shown on a screen
+SIZES = (100, 1000, 10000)
+SCREENS = ("new_list", "old_list", "catalog")
+WINDOW_SIZE = (1280, 800)
+
+
+def peak_memory_mb() -> float:
+    """
+    Returns the peak resident memory of the process so far in MiB, or None if it can't be measured
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def timed(function, *args) -> tuple:
+    """
+    Returns the seconds a single call takes along with its result
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def generate_production_list(size: int) -> list:
+    """
+    Generates the database query result for a new production list with a product for every row
+    """
+    return [(n + 1, f"Product {n + 1}", 6, n % 2, 0, 0, n % 20) for n in range(size)]
+
+
+def generate_catalog(size: int) -> list:
+    """
+    Generates a product catalog with the instructions already loaded
+    """
+    from core import ProductModel
+
+    model_list = []
+    for n in range(size):
+        product_model = ProductModel()
+        product_model.from_tuple((n + 1, f"Product {n + 1}", "Box", 6, n % 2, "Instructions"))
+        model_list.append(product_model)
+    return model_list
+
+
+def show(widget) -> float:
+    """
+    Shows the widget at the window size and renders it once, returning the seconds until the first paint
+    """
+    from PyQt6.QtWidgets import QApplication
+
+    start = time.perf_counter()
+    widget.resize(*WINDOW_SIZE)
+    widget.show()
+    QApplication.processEvents()
+    widget.grab()
+    return time.perf_counter() - start
+
+
+def repaint(widget) -> None:
+    """
+    Handles the pending events and renders the widget again
+    """
+    from PyQt6.QtWidgets import QApplication
+
+    QApplication.processEvents()
+    widget.grab()
+
+
+def benchmark_screen(screen: str, size: int) -> dict:
+    """
+    Builds one screen with synthetic data in this process and measures construction,
+    the first paint, a bulk update of every value with the repaint after it and the peak memory.
+    Runs in a fresh worker process, so the peak memory belongs to the screen alone
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+    import gui
+
+    app = QApplication.instance() or QApplication([])
+    memory_before = peak_memory_mb()
+    results = {}
+
+    if screen == "new_list":
+        gui.PRODUCTION_LIST.load_new(generate_production_list(size))
+        results["construct"], widget = timed(gui.ListDisplayWidget)
+        results["first_paint"] = show(widget)
+        # What the averaging buttons do once their data is loaded
+        usage = {n + 1: n % 30 + 0.5 for n in range(size)}
+        results["bulk_update"] = timed(lambda: (widget.on_average_usage_loaded(usage), repaint(widget)))[0]
+    elif screen == "old_list":
+        data = [(n + 1, f"Product {n + 1}", n % 5, n % 3, n % 20) for n in range(size)]
+        results["construct"], widget = timed(gui.ListDisplayWidget, True)
+        widget.on_old_list_loaded(data)
+        results["first_paint"] = show(widget)
+        # Picking another date replaces every row
+        data = [(n + 1, f"Product {n + 1}", n % 7, n % 2, n % 10) for n in range(size)]
+        results["bulk_update"] = timed(lambda: (widget.on_old_list_loaded(data), repaint(widget)))[0]
+    elif screen == "catalog":
+        catalog = generate_catalog(size)
+        results["construct"], widget = timed(gui.ProductsDisplayWidget, catalog)
+        results["first_paint"] = show(widget)
+        # Opening and closing the details of a product
+        product_widget = widget.list_box_layout.itemAt(0).widget()
+        results["bulk_update"] = timed(lambda: (product_widget.show_details(), product_widget.hide_details(),
+                                                repaint(widget)))[0]
+    else:
+        raise ValueError(f"Unknown screen: {screen}")
+
+    memory_after = peak_memory_mb()
+    if memory_before is not None:
+        results["peak_memory_mb"] = memory_after - memory_before
+    widget.close()
+    return results
+
+
+def run_gui_benchmarks(sizes: tuple = SIZES, screens: tuple = SCREENS, progress = None) -> dict:
+    """
+    Runs every screen at every size, each in its own process
+    """
+    results = {"scales": {}}
+    # A new process for every run, started clean rather than forked from one that may already use Qt
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn"), max_tasks_per_child=1) as executor:
+        for size in sizes:
+            results["scales"][str(size)] = {}
+            for screen in screens:
+                results["scales"][str(size)][screen] = executor.submit(benchmark_screen, screen, size).result()
+                if progress is not None:
+                    progress(size, screen, results["scales"][str(size)][screen])
+    return results
+
+
+def print_screen(size: int, screen: str, results: dict) -> None:
+    """
+    Prints the measurements of one screen, times in milliseconds
+    """
+    memory = results.get("peak_memory_mb")
+    print(f"{size:>6} {screen:<9} construct {results['construct'] * 1000:>9.1f} ms  "
+          f"first paint {results['first_paint'] * 1000:>9.1f} ms  "
+          f"bulk update {results['bulk_update'] * 1000:>9.1f} ms  "
+          f"peak memory {'-' if memory is None else f'{memory:.1f} MiB'}")
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the list and catalog screens on Qt's offscreen platform")
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(SIZES), help="numbers of products to show")
+    parser.add_argument("--screens", nargs="+", choices=SCREENS, default=list(SCREENS), help="screens to measure")
+    parser.add_argument("--output", default="gui_benchmark_results.json", help="file to write the results to")
+    parser.add_argument("--baseline", help="results file to check for regressions against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="fraction a measurement may be above the baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results to the baseline file")
+    args = parser.parse_args(argv)
+
+    results = run_gui_benchmarks(args.sizes, args.screens, print_screen)
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+
+    if args.baseline is None:
+        return 0
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    with open(args.baseline) as file:
+        regressions = find_regressions(results, json.load(file), args.threshold)
+    for size, screen, measurement, baseline_value, value in regressions:
+        print(f"regression: {size} {screen} {measurement} {baseline_value:.4f} -> {value:.4f}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+import sqlite3
+from pathlib import Path
+
+# Fills the UsageTotals table from the whole ProductionData history
+USAGE_TOTALS_BACKFILL = """
+    INSERT OR REPLACE INTO UsageTotals
+    (ProductID, Date, Entries, Remaining, Discarded, Produced)
+    SELECT ProductID, Date,
+    SUM(COUNT(*)) OVER Running, SUM(SUM(Remaining)) OVER Running,
+    SUM(SUM(Discarded)) OVER Running, SUM(SUM(Produced)) OVER Running
+    FROM ProductionData
+    GROUP BY ProductID, Date
+    WINDOW Running AS (PARTITION BY ProductID ORDER BY Date);
+"""
+
+# Fills the ServiceDays table with every day that has production data
+SERVICE_DAYS_BACKFILL = """
+    INSERT OR IGNORE INTO ServiceDays (Date)
+    SELECT DISTINCT Date FROM ProductionData;
+"""
+
+# Every migration is a (version, script) pair. The database stores the version of the
+# last migration it received in PRAGMA user_version, so only newer scripts are executed.
+# New migrations must be appended to the end of the list with the next version number.
+MIGRATIONS = [
+    # 1: The original tables, created manually before migrations existed
+    (1, """
+        CREATE TABLE IF NOT EXISTS Products (
+            ID INTEGER PRIMARY KEY NOT NULL,
+            Name TEXT NOT NULL,
+            PackageName TEXT NOT NULL,
+            PortionsFromPackage REAL NOT NULL,
+            CanPortionPartially INTEGER NOT NULL,
+            Instructions TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS ProductionData (
+            ID INTEGER NOT NULL,
+            ProductID INTEGER NOT NULL,
+            Date DATE NOT NULL,
+            Remaining REAL NOT NULL,
+            Discarded REAL NOT NULL,
+            Produced REAL NOT NULL,
+            PRIMARY KEY (ID)
+            FOREIGN KEY (ProductID) REFERENCES Products(ID) ON DELETE CASCADE
+        );
+    """),
+    # 2: Covering indexes for history lookups by product and by date
+    (2, """
+        CREATE INDEX IF NOT EXISTS ProductionDataByProductDate
+        ON ProductionData (ProductID, Date, Remaining, Discarded, Produced);
+        CREATE INDEX IF NOT EXISTS ProductionDataByDateProduct
+        ON ProductionData (Date, ProductID, Remaining, Discarded, Produced);
+        ANALYZE;
+    """),
+    # 3: Running totals of the production data per product and day, so the average
+    # over any window is the difference of two rows instead of a scan of the history
+    (3, """
+        CREATE TABLE IF NOT EXISTS UsageTotals (
+            ProductID INTEGER NOT NULL,
+            Date DATE NOT NULL,
+            Entries INTEGER NOT NULL,
+            Remaining REAL NOT NULL,
+            Discarded REAL NOT NULL,
+            Produced REAL NOT NULL,
+            PRIMARY KEY (ProductID, Date)
+        ) WITHOUT ROWID;
+    """ + USAGE_TOTALS_BACKFILL),
+    # 4: Calendar of the days the kitchen ran, so the last N service days
+    # are a range of N rows instead of a sort of the whole history
+    (4, """
+        CREATE TABLE IF NOT EXISTS ServiceDays (
+            Date DATE PRIMARY KEY NOT NULL
+        ) WITHOUT ROWID;
+    """ + SERVICE_DAYS_BACKFILL),
+]
+
+
+def get_schema_version(conn_string: str) -> int:
+    """
+    Returns the schema version the database is currently on
+    """
+    try:
+        with sqlite3.connect(conn_string) as conn:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+    except sqlite3.OperationalError as error:
+        raise Exception(error)
+
+
+def check_schema(conn_string: str, kind: str = "database") -> None:
+    """
+    Raises an error unless the database exists and is on the latest schema version.
+    The database is opened read-only, so checking never creates or upgrades it
+    """
+    try:
+        conn = sqlite3.connect(f"{Path(conn_string).absolute().as_uri()}?mode=ro", uri=True)
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            conn.close()
+    except sqlite3.OperationalError as error:
+        raise Exception(f"{conn_string}: {error}")
+
+    if version < MIGRATIONS[-1][0]:
+        raise Exception(f"{conn_string}: {kind} not migrated (schema version {version}, "
+                        f"expected {MIGRATIONS[-1][0]}), open it with the application first")
+
+
+def migrate(conn_string: str) -> int:
+    """
+    Brings the database up to the latest schema version by running every migration
+    newer than its current version. Each migration runs in its own transaction
+    together with the version bump, so a failed upgrade leaves the previous version intact.
+    Returns the version the database is on afterwards
+    """
+    try:
+        conn = sqlite3.connect(conn_string, isolation_level=None)
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for migration_version, script in MIGRATIONS:
+                if migration_version <= version:
+                    continue
+                conn.executescript(f"""
+                    BEGIN;
+                    {script}
+                    PRAGMA user_version = {migration_version};
+                    COMMIT;
+                """)
+                version = migration_version
+            return version
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.close()
+    except sqlite3.OperationalError as error:
+        raise Exception(error)
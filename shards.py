@@ -0,0 +1,82 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from migrations import check_schema
+from core import (
+    calculate_usage_from_averages, adjust_for_packaging,
+    get_usage_sums
+)
+
+
+def find_store_databases(directory: str) -> list:
+    """
+    Returns the paths of all store databases (.db files) in a directory, sorted by name
+    """
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.endswith(".db") and os.path.isfile(os.path.join(directory, name)))
+
+
+def get_store_sums(conn_string: str, days: int) -> list:
+    """
+    Returns the partial sums of one store over its last N service days as plain tuples of
+    (product id, name, portions from package, can portion partially, entries, remaining, discarded, produced).
+    Runs in a worker process. The store must already be on the latest schema
+    """
+    # A report never changes or upgrades a store database
+    check_schema(conn_string, "store")
+    return [d[0:4] + tuple(d[4][days]) for d in get_usage_sums(conn_string, (days,))]
+
+
+def calculate_store_usage(sums: list) -> list:
+    """
+    Calculates the usage of every product of a store from its partial sums, the way
+    get_data_for_new_list does. Returns tuples of (product id, name, usage, adjusted usage)
+    """
+    return_data = []
+    for id, name, portions_from_package, can_portion_partially, entries, remaining, discarded, produced in sums:
+        usage = calculate_usage_from_averages(remaining / entries, discarded / entries, produced / entries)
+        adjusted = adjust_for_packaging(usage, can_portion_partially, portions_from_package)
+        return_data.append((id, name, usage, adjusted))
+    return return_data
+
+
+def merge_store_sums(store_sums: dict) -> list:
+    """
+    Merges the partial sums of several stores into chain-wide numbers per product.
+    Product IDs differ between stores, so products are matched by name.
+    Returns tuples of (name, stores, entries, usage per store and day, total daily usage),
+    where the total is the sum of the usage of every store selling the product
+    """
+    merged = {}
+    for sums in store_sums.values():
+        for id, name, portions_from_package, can_portion_partially, entries, remaining, discarded, produced in sums:
+            # stores, entries, remaining, discarded, produced, total daily usage
+            totals = merged.setdefault(name, [0, 0, 0.0, 0.0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += entries
+            totals[2] += remaining
+            totals[3] += discarded
+            totals[4] += produced
+            totals[5] += calculate_usage_from_averages(remaining / entries, discarded / entries, produced / entries)
+
+    return_data = []
+    for name in sorted(merged):
+        stores, entries, remaining, discarded, produced, total_usage = merged[name]
+        usage = calculate_usage_from_averages(remaining / entries, discarded / entries, produced / entries)
+        return_data.append((name, stores, entries, usage, round(total_usage, 1)))
+    return return_data
+
+
+def get_chain_usage(directory: str, days: int, workers: int = None) -> tuple:
+    """
+    Treats every store database in a directory as one dataset. The partial sums of the stores
+    are read in parallel by a process pool and merged afterwards.
+    Returns a dictionary of per-store usage keyed by database path and the chain-wide usage
+    """
+    paths = find_store_databases(directory)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(get_store_sums, paths, [days] * len(paths))
+        store_sums = dict(zip(paths, results))
+
+    store_usage = {path: calculate_store_usage(sums) for path, sums in store_sums.items()}
+    return store_usage, merge_store_sums(store_sums)
@@ -1,10 +1,51 @@
+import gc
+import json
+import pytest
+import sqlite3
+import subprocess
+import sys
+import threading
+from datetime import date
+import cli
+from shards import get_chain_usage
+from bulk import import_production_data, export_production_data
+from dummydatagenerator import generate_scenario
+from benchmark import run_benchmarks, find_regressions
+from gui_benchmark import run_gui_benchmarks
+from connection import get_connection, close_connections
+from cache import QUERY_CACHE, INSTRUCTIONS_CACHE, get_cache_stats
+from tracing import QUERY_TRACER, enable_tracing, disable_tracing, get_query_stats, get_slow_queries
+from migrations import MIGRATIONS, migrate, get_schema_version
 from project import (
+    ProductionDataModel,
+    ProductModel,
+    ProductionList,
     calculate_usage, 
     calculate_production,
     adjust_for_packaging,
-    insert_product
+    get_all_products,
+    get_product_instructions,
+    insert_product,
+    update_product,
+    get_usage_aggregates,
+    get_data_for_new_list,
+    get_average_usage_by_product,
+    get_old_list,
+    insert_production_data
 )
 
+# Seconds importing project (the core) may take
+IMPORT_BUDGET = 0.25
+
+
+def create_test_database(path) -> str:
+    """
+    Creates an empty database with the application tables and returns its connection string
+    """
+    conn_string = str(path / "test_database.db")
+    migrate(conn_string)
+    return conn_string
+
 def test_calclulate_usage():
     test_remaining = [3.3, 5.2, 2, 3.2, 4, 1.5] # sum: 19,2 | mean: 3.2
     test_produced = [2, 3, 0.5, 2, 1, 3] # sum: 11,5 | mean: 1.916666666
@@ -34,4 +75,769 @@ def test_adjust_for_packaging():
     assert adjust_for_packaging(7, False, 5) == 10
     # 4.5 portions needed, packaging contains 7 portions, can be portioned partially 
     assert adjust_for_packaging(4.5, True, 7) == 4.5 
+    # exact multiples are not rounded up a package because of float drift
+    assert adjust_for_packaging(0.3, False, 0.1) == 0.3
+    assert adjust_for_packaging(0.7, False, 0.1) == 0.7
+    # fractional package sizes
+    assert adjust_for_packaging(5.1, False, 2.5) == 7.5
+    # no package size or nothing to produce
+    assert adjust_for_packaging(4.2, False, 0) == 4.2
+    assert adjust_for_packaging(0, False, 5) == 0
+    assert adjust_for_packaging(3_000_000, False, 0.5) == 3_000_000
+
+
+
+
+def test_production_list():
+    production_list = ProductionList()
+    production_list.load_new([(4, "Cream", 5, 0, 0, 0, 10), (9, "Sauce", 1, 1, 0, 0, 2.5)])
+    data_model = ProductionDataModel()
+    data_model.from_tuple_new((2, "Bread", 6, 0, 0, 0, 7))
+    production_list.append(data_model)
+
+    assert len(production_list) == 3
+    assert [model.name for model in production_list] == ["Cream", "Sauce", "Bread"]
+    assert production_list.row_of(9) == 1 and production_list.row_of(5) is None
+    # rows write straight into the columns
+    row = production_list.get(9)
+    row.remaining = 1.5
+    row.completed = True
+    assert production_list[1].remaining == 1.5 and production_list[-2].completed is True
+    assert production_list.to_tuples(date(2024, 5, 1))[1] == (9, date(2024, 5, 1), 1.5, 0.0, 2.5)
+
+    with pytest.raises(AttributeError):
+        data_model.extra = 1
+    assert ProductModel().id == 0
+
+
+def test_apply_averages(tmp_path):
+    pytest.importorskip("PyQt6")
+    from gui import ProductionListModel
+
+    conn_string = create_test_database(tmp_path)
+    insert_product(conn_string, ("Cream", "Bottle", 5, False, ""))
+    insert_product(conn_string, ("Sauce", "Tub", 1, True, ""))
+    insert_product(conn_string, ("Bread", "Bag", 1, True, ""))
+    insert_production_data(conn_string, [(1, "2024-05-01", 1, 0, 3), (3, "2024-05-01", 2, 0, 2)])
+    insert_production_data(conn_string, [(1, "2024-05-02", 1, 0, 7), (2, "2024-05-02", 2, 0, 2)])
+    # Sauce has no data from the last day, so it is left out instead of shifting the others
+    assert get_average_usage_by_product(conn_string, 1) == {1: 10, 2: 4}
+
+    production_list = ProductionList()
+    production_list.load_new([(1, "Cream", 5, 0, 2, 0, 6), (2, "Sauce", 1, 1, 1, 0, 3),
+                              (3, "Bread", 1, 1, 0, 0, 4)])
+    list_model = ProductionListModel(production_list)
+    changes = []
+    list_model.dataChanged.connect(lambda top_left, bottom_right: changes.append((top_left.row(), bottom_right.row())))
+
+    list_model.apply_averages({3: 2.5, 1: 10, 7: 1})
+    assert list(production_list.averages) == [10, 3, 2.5]
+    assert list(production_list.produced) == [8, 3, 2.5]
+    # one change for the whole list
+    assert changes == [(0, 2)]
+
+
+def test_update_products(monkeypatch):
+    pytest.importorskip("PyQt6")
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+    from gui import ProductsDisplayWidget
+
+    app = QApplication.instance() or QApplication([])
+    catalog = [(1, "Cream", "Bottle", 5, 0), (2, "Sauce", "Tub", 1, 1), (3, "Bread", "Bag", 1, 1)]
+    widget = ProductsDisplayWidget([])
+    widget.update_products(catalog)
+    cream = widget.list_box_layout.itemAt(0).widget()
+
+    # Sauce removed, Cream renamed and Milk added
+    widget.update_products([(1, "Fresh cream", "Bottle", 5, 0), (3, "Bread", "Bag", 1, 1), (4, "Milk", "Box", 1, 1)])
+    products = [widget.list_box_layout.itemAt(n).widget() for n in range(widget.list_box_layout.count())]
+    assert [product.model.name for product in products] == ["Fresh cream", "Bread", "Milk"]
+    # unchanged and updated products keep their widgets
+    assert products[0] is cream and cream.name_edit.text() == "Fresh cream"
+    widget.close()
+
+
+def test_product_details(monkeypatch):
+    pytest.importorskip("PyQt6")
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6 import sip
+    from PyQt6.QtCore import QCoreApplication, QEvent
+    from PyQt6.QtWidgets import QApplication
+    import gui
+
+    app = QApplication.instance() or QApplication([])
+    monkeypatch.setattr(gui, "get_product_instructions", lambda conn_string, id: "Shake well")
+    model = ProductModel()
+    model.from_tuple((1, "Cream", "Bottle", 5, 0))
+    widget = gui.ProductDataWidget(model)
+    # rows are built without the details editor
+    assert widget.details is None and widget.findChildren(gui.ProductDetailsWidget) == []
+
+    # expanding fetches the instructions first, then builds the editor
+    widget.details_button.click()
+    assert widget.details is None
+    gui.get_database_worker().pool.waitForDone()
+    app.processEvents()
+    details = widget.details
+    assert details is not None and details.instructions_edit.toPlainText() == "Shake well"
+
+    details.edit_checkbox.setChecked(True)
+    details.package_name_edit.setText("Jar")
+    details.instructions_edit.setText("Stir")
+    assert model.package_name == "Jar" and model.instructions == "Stir"
+
+    # collapsing releases the editor and discards the unsaved edits
+    widget.details_button.click()
+    QCoreApplication.sendPostedEvents(None, QEvent.Type.DeferredDelete.value)
+    assert widget.details is None and sip.isdeleted(details)
+    assert model.package_name == "Bottle" and model.instructions == "Shake well"
+    widget.details_button.click()
+    assert widget.details.package_name_edit.text() == "Bottle"
+    widget.close()
+
+
+def test_main_window_pages(monkeypatch):
+    pytest.importorskip("PyQt6")
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication, QWidget
+    import gui
+
+    app = QApplication.instance() or QApplication([])
+    errors = []
+    monkeypatch.setattr(sys, "excepthook", lambda *error: errors.append(error))
+
+    def open_pages() -> None:
+        window = gui.MainWindow()
+        window.on_view_list_button_clicked()
+        old_list = window.pages.currentWidget()
+        window.on_new_product_button_clicked()
+        # returning to a page shows the one already built
+        window.on_view_list_button_clicked()
+        assert window.pages.currentWidget() is old_list
+        assert list(window.cached_pages) == ["new product", "old list"]
+
+        # over the cap the least recently shown pages are dropped, the catalog last
+        window.on_products_loaded([(n, f"Product {n}", "Box", 1, 1) for n in range(1, 101)])
+        sizes = {name: len(page.findChildren(QWidget)) + 1 for name, page in window.cached_pages.items()}
+        monkeypatch.setattr(gui, "MAX_PAGE_WIDGETS", sizes["products"] + sizes["new product"])
+        window.on_new_product_button_clicked()
+        assert list(window.cached_pages) == ["products", "new product"]
+        # the catalog counts towards the cap too
+        monkeypatch.setattr(gui, "MAX_PAGE_WIDGETS", sizes["products"])
+        window.on_view_list_button_clicked()
+        assert list(window.cached_pages) == ["old list"]
+
+    # the pages are destroyed after the window without errors
+    open_pages()
+    gc.collect()
+    app.processEvents()
+    assert errors == []
+
+
+def test_main_window_list_completion(monkeypatch):
+    pytest.importorskip("PyQt6")
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication, QMessageBox
+    import gui
+
+    app = QApplication.instance() or QApplication([])
+    monkeypatch.setattr(QMessageBox, "question", lambda *args: QMessageBox.StandardButton.Yes)
+    errors = []
+    monkeypatch.setattr(QMessageBox, "information", lambda *args: errors.append(args[2]))
+    release = threading.Event()
+    saved = []
+    monkeypatch.setattr(gui, "insert_production_data", lambda conn_string, data: release.wait() and saved.append(data))
+
+    def failed_load(conn_string: str, days: int) -> list:
+        raise Exception("database is locked")
+
+    window = gui.MainWindow()
+    window.on_new_list_data_loaded([(1, "Cream", 5, 0, 1, 0, 3)])
+    page = window.pages.currentWidget()
+    gui.PRODUCTION_LIST[0].completed = True
+
+    # a new list can't be started while the current one is being written
+    page.on_complete_list_button_clicked()
+    assert not window.new_list_button.isEnabled() and not page.complete_list_button.isEnabled()
+    # a list loaded in the meantime isn't cleared once the write finishes
+    window.on_new_list_data_loaded([(2, "Bread", 1, 0, 0, 0, 4)])
+    release.set()
+    gui.get_database_worker().pool.waitForDone()
+    app.processEvents()
+    assert len(saved) == 1 and list(gui.PRODUCTION_LIST.ids) == [2]
+    assert window.new_list_button.isEnabled()
+
+    # the current list is kept when the new one fails to load
+    monkeypatch.setattr(gui, "get_data_for_new_list", failed_load)
+    window.on_new_list_button_clicked()
+    gui.get_database_worker().pool.waitForDone()
+    app.processEvents()
+    assert errors == ["database is locked"] and list(gui.PRODUCTION_LIST.ids) == [2]
+    gui.PRODUCTION_LIST.clear()
+    window.deleteLater()
+
+
+def test_database_worker(monkeypatch):
+    pytest.importorskip("PyQt6")
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6 import sip
+    from PyQt6.QtCore import QCoreApplication, QObject
+    from gui import DatabaseWorker
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    worker = DatabaseWorker()
+    busy = []
+    worker.busy_changed.connect(busy.append)
+    results = []
+
+    def wait() -> None:
+        worker.pool.waitForDone()
+        app.processEvents()
+
+    # a newer task with the same owner and key drops the result of the stale one
+    owner = QObject()
+    release = threading.Event()
+    worker.submit(owner, "list", lambda: release.wait() and "stale", (), results.append, results.append)
+    worker.submit(owner, "list", lambda: "fresh", (), results.append, results.append)
+    release.set()
+    wait()
+    assert results == ["fresh"]
+    assert busy[-1] is False and worker.tasks == {}
+
+    # errors go to the failure callback
+    worker.submit(owner, "list", lambda: 1 / 0, (), results.append, lambda error: results.append(type(error)))
+    wait()
+    assert results == ["fresh", ZeroDivisionError]
+
+    # a destroyed owner drops its tasks
+    other = QObject()
+    worker.submit(other, "list", lambda: "orphan", (), results.append, results.append)
+    sip.delete(other)
+    wait()
+    assert results == ["fresh", ZeroDivisionError] and worker.tasks == {}
+
+    # cancelling a task that has already run, with its result still on the way
+    task = worker.submit(owner, "list", lambda: "late", (), results.append, results.append)
+    worker.pool.waitForDone()
+    worker.cancel(owner, "list")
+    app.processEvents()
+    assert results == ["fresh", ZeroDivisionError] and worker.tasks == {}
+    assert busy[-1] is False
+
+
+def test_edit_production_values(monkeypatch):
+    pytest.importorskip("PyQt6")
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtCore import Qt
+    from PyQt6.QtTest import QTest
+    from PyQt6.QtWidgets import QApplication, QTableView, QDoubleSpinBox
+    from gui import ProductionListModel, ProductionValueDelegate
+
+    app = QApplication.instance() or QApplication([])
+    production_list = ProductionList()
+    production_list.load_new([(1, "Cream", 5, 1, 0, 0, 4)])
+    list_model = ProductionListModel(production_list)
+    view = QTableView()
+    view.setModel(list_model)
+    view.setItemDelegate(ProductionValueDelegate(view))
+    view.show()
+    changes = []
+    list_model.dataChanged.connect(lambda top_left, bottom_right: changes.append((top_left.column(), bottom_right.column())))
+
+    # a decimal value survives being typed key by key
+    index = list_model.index(0, ProductionListModel.REMAINING_COLUMN)
+    view.edit(index)
+    editor = view.findChild(QDoubleSpinBox)
+    editor.selectAll()
+    QTest.keyClicks(editor, "1.5")
+    QTest.keyClick(editor, Qt.Key.Key_Return)
+    # the delegate commits through a queued call
+    app.processEvents()
+    assert production_list.remaining[0] == 1.5
+    assert production_list.produced[0] == 2.5
+    # only the recalculated cell is reported
+    assert changes == [(ProductionListModel.PRODUCED_COLUMN, ProductionListModel.PRODUCED_COLUMN)]
+    view.close()
+
+
+def test_get_usage_aggregates(tmp_path):
+    conn_string = create_test_database(tmp_path)
+    insert_product(conn_string, ("Cream", "Bottle", 5, False, ""))
+    insert_product(conn_string, ("Sauce", "Tub", 1, True, ""))
+    insert_production_data(conn_string, [(1, "2024-05-01", 1, 0, 3), (1, "2024-05-03", 3, 0, 2),
+                                          (2, "2024-05-01", 2, 0, 2), (2, "2024-05-02", 4, 0, 2)])
+    # a backdated entry updates the running totals of the days after it
+    insert_production_data(conn_string, [(1, "2024-05-02", 2, 1, 4)])
+
+    data = get_usage_aggregates(conn_string, (1, 2, 3))
+    # one row per product, windows count distinct days back from the latest date
+    assert len(data) == 2
+    assert data[0][4] == {1: (3, 0, 2), 2: (2.5, 0.5, 3), 3: (2, 1 / 3, 3)}
+    # product without data on the latest day has no average for that window
+    assert data[1][4] == {1: None, 2: (4, 0, 2), 3: (3, 0, 2)}
+
+    # average usage 5 for "Cream" gets rounded up to a whole 5 portion package
+    assert get_data_for_new_list(conn_string, 1)[0][6] == 5
+    assert get_data_for_new_list(conn_string, 3)[1][6] == 5
+
+
+def test_get_product_instructions(tmp_path, monkeypatch):
+    import core
+
+    conn_string = create_test_database(tmp_path)
+    insert_product(conn_string, ("Cream", "Bottle", 5, False, "Shake well"))
+    # the catalog leaves the instructions out
+    assert get_all_products(conn_string) == [(1, "Cream", "Bottle", 5, 0)]
+    product = ProductModel()
+    product.from_tuple(get_all_products(conn_string)[0])
+    assert product.instructions is None
+
+    assert get_product_instructions(conn_string, 1) == "Shake well"
+    assert get_product_instructions(conn_string, 2) is None
+    # served from the cache until the database changes
+    hits = INSTRUCTIONS_CACHE.stats()["hits"]
+    assert get_product_instructions(conn_string, 1) == "Shake well"
+    assert INSTRUCTIONS_CACHE.stats()["hits"] == hits + 1
+    with get_connection(conn_string) as conn:
+        conn.execute("UPDATE Products SET Instructions = 'Changed' WHERE ID = 1")
+    assert get_product_instructions(conn_string, 1) == "Changed"
+
+    # long instructions stay plain text unless compression is turned on
+    update_product(conn_string, ("Cream", "Bottle", 5, False, "Shake well " * 1000), 1)
+    with get_connection(conn_string) as conn:
+        assert conn.execute("SELECT typeof(Instructions) FROM Products").fetchone()[0] == "text"
+    monkeypatch.setattr(core, "COMPRESS_INSTRUCTIONS_OVER", 10)
+    update_product(conn_string, ("Cream", "Bottle", 5, False, "Shake well " * 100), 1)
+    assert get_product_instructions(conn_string, 1) == "Shake well " * 100
+    with get_connection(conn_string) as conn:
+        assert conn.execute("SELECT typeof(Instructions) FROM Products").fetchone()[0] == "blob"
+
+
+def test_migrate(tmp_path):
+    conn_string = create_test_database(tmp_path)
+    assert get_schema_version(conn_string) == MIGRATIONS[-1][0]
+    # running again is a no-op
+    assert migrate(conn_string) == MIGRATIONS[-1][0]
+
+    with sqlite3.connect(conn_string) as conn:
+        plan = conn.execute("""
+            EXPLAIN QUERY PLAN
+            SELECT Remaining FROM ProductionData WHERE ProductID = 1 AND Date >= '2024-01-01'
+        """).fetchall()
+    assert "COVERING INDEX" in plan[0][3]
+
+
+def test_get_connection(tmp_path):
+    conn_string = create_test_database(tmp_path)
+    # the same thread keeps reusing one connection
+    assert get_connection(conn_string) is get_connection(conn_string)
+
+    # other threads get a handle of their own
+    other = []
+    thread = threading.Thread(target=lambda: other.append(get_connection(conn_string)))
+    thread.start()
+    thread.join()
+    assert other[0] is not get_connection(conn_string)
+
+    insert_product(conn_string, ("Cream", "Bottle", 5, False, ""))
+    assert other[0].execute("SELECT COUNT(*) FROM Products").fetchone()[0] == 1
+
+    # the connection of a thread that has exited is closed along with it
+    del thread
+    gc.collect()
+    with pytest.raises(sqlite3.ProgrammingError):
+        other[0].execute("SELECT 1")
+    close_connections()
+
+
+def test_usage_totals_backfill(tmp_path):
+    conn_string = str(tmp_path / "old_database.db")
+    with sqlite3.connect(conn_string) as conn:
+        conn.executescript(MIGRATIONS[0][1] + "PRAGMA user_version = 2;")
+        conn.execute("INSERT INTO Products VALUES (1, 'Cream', 'Bottle', 5, 0, '')")
+        conn.executemany("""
+            INSERT INTO ProductionData (ProductID, Date, Remaining, Discarded, Produced)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(1, "2024-05-01", 1, 0, 3), (1, "2024-05-02", 2, 1, 4), (1, "2024-05-03", 3, 0, 2)])
+
+    # upgrading an existing database fills in the totals from its history
+    migrate(conn_string)
+    assert get_average_usage_by_product(conn_string, 2) == {1: 5}
+    assert get_usage_aggregates(conn_string, (3,))[0][4] == {3: (2, 1 / 3, 3)}
+    with get_connection(conn_string) as conn:
+        assert conn.execute("SELECT Date FROM ServiceDays").fetchall() == [
+            ("2024-05-01",), ("2024-05-02",), ("2024-05-03",)]
+
+
+def test_service_days(tmp_path):
+    conn_string = create_test_database(tmp_path)
+    for name in ("Cream", "Sauce", "Bread"):
+        insert_product(conn_string, (name, "Tub", 1, True, ""))
+    insert_production_data(conn_string, [(id, "2024-05-02", 0, 0, 4) for id in (1, 2, 3)])
+    insert_production_data(conn_string, [(id, "2024-05-03", 0, 0, 6) for id in (1, 2, 3)])
+    # a backdated list adds its day to the calendar as well
+    insert_production_data(conn_string, [(1, "2024-05-01", 0, 0, 2)])
+
+    with get_connection(conn_string) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM ServiceDays").fetchone()[0] == 3
+    # windows count service days, not rows, however many products there are
+    assert get_average_usage_by_product(conn_string, 1) == {1: 6, 2: 6, 3: 6}
+    assert get_average_usage_by_product(conn_string, 2) == {1: 5, 2: 5, 3: 5}
+    assert get_average_usage_by_product(conn_string, 3) == {1: 4, 2: 5, 3: 5}
+    # a window has to span at least one day instead of falling back to the whole history
+    for days in (0, -5):
+        with pytest.raises(ValueError):
+            get_average_usage_by_product(conn_string, days)
+        with pytest.raises(ValueError):
+            get_usage_aggregates(conn_string, (7, days))
+
+
+def test_batch_calculations():
+    np = pytest.importorskip("numpy")
+    from forecasting import batch_usage, batch_production, batch_adjust_for_packaging, update_list_production
+
+    remaining = np.array([[3.3, 5.2, 2, 3.2, 4, 1.5], [1, np.nan, 3, np.nan, np.nan, np.nan]])
+    discarded = np.array([[0.5, 1, 0, 0.2, 0, 1], [0, np.nan, 1, np.nan, np.nan, np.nan]])
+    produced = np.array([[2, 3, 0.5, 2, 1, 3], [2, np.nan, 2, np.nan, np.nan, np.nan]])
+    # same results as the scalar functions, days without data are skipped
+    assert list(batch_usage(remaining, discarded, produced, 2)) == [
+        calculate_usage([3.3, 5.2, 2, 3.2, 4, 1.5], [0.5, 1, 0, 0.2, 0, 1], [2, 3, 0.5, 2, 1, 3], 2),
+        calculate_usage([1, 3], [0, 1], [2, 2], 2)]
+    assert list(batch_production(np.array([3, 7, 3.4]), np.array([5, 2, 5.7]), 1.5, 2)) == [
+        calculate_production(3, 5, 1.5, 2), calculate_production(7, 2, 1.5, 2), calculate_production(3.4, 5.7, 1.5, 2)]
+    assert list(batch_adjust_for_packaging(np.array([7, 4.5, 0]), np.array([False, True, False]),
+                                           np.array([5, 7, 5]))) == [10, 4.5, 0]
+    production = np.array([0.3, 0.7, 5.1, 4.2, 0])
+    assert list(batch_adjust_for_packaging(production, np.zeros(5, dtype=bool), np.array([0.1, 0.1, 2.5, 0, 5]))) == [
+        adjust_for_packaging(p, False, s) for p, s in zip([0.3, 0.7, 5.1, 4.2, 0], [0.1, 0.1, 2.5, 0, 5])]
+
+    # a whole production list is recalculated at once
+    production_list = ProductionList()
+    production_list.load_new([(4, "Cream", 5, 0, 3, 0, 10), (9, "Sauce", 1, 1, 1.5, 0, 2.5), (2, "Bread", 6, 0, 8, 0, 7)])
+    update_list_production(production_list)
+    assert list(production_list.produced) == [10, 1, 0]
+
+
+def test_forecast(tmp_path):
+    pytest.importorskip("numpy")
+    from forecasting import load_history, forecast
+
+    conn_string = create_test_database(tmp_path)
+    insert_product(conn_string, ("Cream", "Bottle", 5, False, ""))
+    insert_product(conn_string, ("Sauce", "Tub", 1, True, ""))
+    insert_production_data(conn_string, [(1, "2024-05-01", 1, 0, 3), (1, "2024-05-02", 2, 1, 4),
+                                         (2, "2024-05-01", 2, 0, 2), (2, "2024-05-02", 4, 0.5, 2.3)])
+
+    ids, usage, production, adjusted = forecast(conn_string, 7)
+    assert list(ids) == [d[0] for d in get_data_for_new_list(conn_string, 7)]
+    assert list(adjusted) == [d[6] for d in get_data_for_new_list(conn_string, 7)]
+
+    # two lists saved on one day count as two entries, a product without history is left out
+    insert_product(conn_string, ("Bread", "Bag", 1, True, ""))
+    insert_production_data(conn_string, [(2, "2024-05-02", 0, 0, 14)])
+    ids, usage, production, adjusted = forecast(conn_string, 7)
+    assert list(ids) == [1, 2] == [d[0] for d in get_data_for_new_list(conn_string, 7)]
+    assert list(adjusted) == [d[6] for d in get_data_for_new_list(conn_string, 7)]
+
+    # the history is traced with a row for every product
+    QUERY_TRACER.reset()
+    enable_tracing(slow_threshold=0)
+    try:
+        load_history(conn_string, 7)
+    finally:
+        disable_tracing()
+    assert {row[0]: row for row in get_query_stats()}["load_history"][1:3] == (1, 3)
+    QUERY_TRACER.reset()
+
+
+def test_query_cache(tmp_path):
+    conn_string = create_test_database(tmp_path)
+    insert_product(conn_string, ("Cream", "Bottle", 5, False, ""))
+    insert_production_data(conn_string, [(1, "2024-05-01", 1, 0, 3)])
+    QUERY_CACHE.clear()
+
+    assert get_data_for_new_list(conn_string, 7)[0][6] == 5
+    assert get_average_usage_by_product(conn_string, 7) == {1: 5}
+    assert get_cache_stats()["hits"] == 1
+    assert get_cache_stats()["misses"] == 1
+
+    # writes through DB OPS invalidate the cache
+    insert_production_data(conn_string, [(1, "2024-05-02", 1, 0, 13)])
+    assert get_average_usage_by_product(conn_string, 7) == {1: 10}
+    assert get_cache_stats()["misses"] == 2
+
+    # so do writes from other connections
+    with sqlite3.connect(conn_string) as conn:
+        conn.execute("UPDATE Products SET PortionsFromPackage = 3")
+    assert get_average_usage_by_product(conn_string, 7) == {1: 9}
+    assert get_cache_stats()["misses"] == 3
+
+    # other threads reuse the cached result until another connection writes
+    def read_in_thread() -> list:
+        result = []
+        thread = threading.Thread(target=lambda: result.append(get_average_usage_by_product(conn_string, 7)))
+        thread.start()
+        thread.join()
+        return result[0]
+
+    assert read_in_thread() == {1: 9}
+    assert get_cache_stats()["misses"] == 3
+    with sqlite3.connect(conn_string) as conn:
+        conn.execute("UPDATE Products SET PortionsFromPackage = 4")
+    assert read_in_thread() == {1: 12}
+    assert get_cache_stats()["misses"] == 4
+
+
+def test_query_cache_across_pool_threads(tmp_path, monkeypatch):
+    pytest.importorskip("PyQt6")
+    monkeypatch.setenv("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtCore import QCoreApplication, QObject
+    from gui import DatabaseWorker
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    conn_string = create_test_database(tmp_path)
+    insert_product(conn_string, ("Cream", "Bottle", 5, False, ""))
+    insert_production_data(conn_string, [(1, "2024-05-01", 1, 0, 3)])
+    QUERY_CACHE.clear()
+    get_data_for_new_list(conn_string, 7)
+    get_data_for_new_list(conn_string, 30)
+
+    worker = DatabaseWorker()
+    worker.pool.setMaxThreadCount(3)
+    # every read waits for two others, so each round runs on three threads at once
+    barrier = threading.Barrier(3, timeout=10)
+    threads = set()
+    results = []
+
+    def read(days: int) -> list:
+        barrier.wait()
+        threads.add(threading.get_ident())
+        return get_data_for_new_list(conn_string, days)
+
+    def read_round() -> None:
+        owners = [QObject() for _ in range(3)]
+        for owner, days in zip(owners, (7, 30, 7)):
+            worker.submit(owner, "list", read, (days,), results.append, results.append)
+        worker.pool.waitForDone()
+        app.processEvents()
+
+    # results cached on the GUI thread are hits on every pool thread
+    for _ in range(3):
+        read_round()
+    assert len(threads) >= 3 and len(results) == 9
+    assert get_cache_stats()["hits"] == 9 and get_cache_stats()["misses"] == 2
+
+    # a write from another connection is seen by all of them
+    with sqlite3.connect(conn_string) as conn:
+        conn.execute("UPDATE Products SET PortionsFromPackage = 3")
+    read_round()
+    assert [result[0][6] for result in results[:3]] == [5, 5, 5]
+    assert [result[0][6] for result in results[-3:]] == [6, 6, 6]
+
+
+def test_query_tracing(tmp_path):
+    conn_string = create_test_database(tmp_path)
+    QUERY_TRACER.reset()
+    insert_product(conn_string, ("Cream", "Bottle", 5, False, ""))
+    # nothing is recorded while tracing is disabled
+    assert get_query_stats() == []
+
+    trace_path = tmp_path / "trace.jsonl"
+    enable_tracing(str(trace_path), slow_threshold=0)
+    try:
+        insert_production_data(conn_string, [(1, "2024-05-01", 1, 0, 3), (1, "2024-05-02", 2, 0, 2)])
+        get_data_for_new_list(conn_string, 7)
+        with pytest.raises(Exception):
+            get_old_list(str(tmp_path / "empty.db"), "2024-05-01")
+    finally:
+        disable_tracing()
+
+    stats = {row[0]: row for row in get_query_stats()}
+    # function, calls, rows, total, mean, max, slow, errors
+    assert stats["insert_production_data"][1:3] == (1, 2 + 2 + 3 + 2)
+    assert stats["get_data_for_new_list"][1:3] == (1, 1)
+    assert stats["get_usage_sums"][1:3] == (1, 1)
+    assert stats["get_old_list"][7] == 1
+    assert len(get_slow_queries()) == 6
+
+    trace = [json.loads(line) for line in trace_path.read_text().splitlines()]
+    assert [entry["function"] for entry in trace] == [
+        "insert_production_data", "get_service_days", "get_usage_sums", "get_usage_aggregates", "get_data_for_new_list", "get_old_list"]
+    # BEGIN, one statement per row or day for each of the four executemany calls and COMMIT
+    assert trace[0]["statement_count"] == 10 and "'2024-05-01'" in trace[0]["statements"][1]
+    assert trace[2]["parameters"] == "((7,),)"
+
+    # reads that don't return a list count their rows too
+    QUERY_TRACER.reset()
+    insert_product(conn_string, ("Milk", "Carton", 4, False, "Shake well"))
+    enable_tracing(slow_threshold=0)
+    try:
+        get_product_instructions(conn_string, 2)
+        get_average_usage_by_product(conn_string, 7)
+    finally:
+        disable_tracing()
+    stats = {row[0]: row for row in get_query_stats()}
+    assert stats["get_product_instructions"][1:3] == (1, 1)
+    assert stats["get_average_usage_by_product"][1:3] == (1, 1)
+    QUERY_TRACER.reset()
+
+
+def test_cli_complete(tmp_path, capsys):
+    conn_string = create_test_database(tmp_path)
+    insert_product(conn_string, ("Cream", "Bottle", 5, False, ""))
+    insert_product(conn_string, ("Sauce", "Tub", 1, True, ""))
+    insert_production_data(conn_string, [(1, "2024-05-01", 1, 0, 3), (2, "2024-05-01", 2, 0, 2)])
+    counts = tmp_path / "counts.csv"
+    counts.write_text("ProductID,Remaining,Discarded,Produced\n1,1,0,\n2,1.5,0.5,3\n")
+
+    assert cli.main(["--database", conn_string, "complete", str(counts), "--date", "2024-05-02",
+                     "--output", str(tmp_path / "plan.csv")]) == 0
+    # produced is recalculated for products without a counted value
+    assert (tmp_path / "plan.csv").read_text().splitlines()[1:] == [
+        "1,Cream,1.0,0.0,5.0,5.0", "2,Sauce,1.5,0.5,3.0,4.0"]
+    assert get_data_for_new_list(conn_string, 1)[0][6] == 10
+
+    # every product needs a count
+    counts.write_text("ProductID,Remaining,Discarded\n1,1,0\n")
+    assert cli.main(["--database", conn_string, "complete", str(counts)]) == 1
+    assert "No counts for: Sauce" in capsys.readouterr().err
+    with pytest.raises(SystemExit):
+        cli.main(["--database", conn_string, "plan", "--days", "-5"])
+    assert "must be a positive number" in capsys.readouterr().err
+
+    # a mistyped path is an error rather than a new empty database
+    missing = str(tmp_path / "missing.db")
+    assert cli.main(["--database", missing, "plan"]) == 1
+    assert "no such database file" in capsys.readouterr().err
+    assert not (tmp_path / "missing.db").exists()
+
+    # reading an outdated database doesn't upgrade it, completing a list does
+    old = str(tmp_path / "old.db")
+    with sqlite3.connect(old) as conn:
+        conn.executescript(MIGRATIONS[0][1] + "PRAGMA user_version = 1;")
+    for command in (["plan"], ["export", str(tmp_path / "history.csv")], ["complete", str(counts), "--dry-run"]):
+        assert cli.main(["--database", old] + command) == 1
+        assert "database not migrated" in capsys.readouterr().err
+    assert get_schema_version(old) == 1
+    counts.write_text("ProductID,Remaining,Discarded\n")
+    assert cli.main(["--database", old, "complete", str(counts)]) == 0
+    assert get_schema_version(old) == MIGRATIONS[-1][0]
+
+
+def test_bulk_import_export(tmp_path):
+    conn_string = create_test_database(tmp_path)
+    insert_product(conn_string, ("Cream", "Bottle", 5, False, ""))
+    insert_product(conn_string, ("Sauce", "Tub", 1, True, ""))
+    history = tmp_path / "history.csv"
+    history.write_text("ProductID,Date,Remaining,Discarded,Produced\n"
+                       "1,2024-05-01,1,0,4\n2,2024-05-01,2,0,2\n1,2024-05-02,3,1,5\n")
+
+    # small chunks so the rows are split over several batches
+    rows, seconds, rate = import_production_data(conn_string, str(history), chunk_size=2)
+    assert rows == 3
+    assert get_data_for_new_list(conn_string, 30) == [
+        (1, "Cream", 5, 0, 0, 0, 10), (2, "Sauce", 1, 1, 0, 0, 4)]
+    # the dropped indexes are back
+    with get_connection(conn_string) as conn:
+        indexes = conn.execute("SELECT name FROM sqlite_master WHERE tbl_name = 'ProductionData' AND type = 'index'")
+        assert len(indexes.fetchall()) == 2
+
+    exported = tmp_path / "export.csv"
+    assert export_production_data(conn_string, str(exported), chunk_size=2)[0] == 3
+    assert exported.read_text().splitlines() == [
+        "ProductID,Name,Date,Remaining,Discarded,Produced", "1,Cream,2024-05-01,1.0,0.0,4.0",
+        "2,Sauce,2024-05-01,2.0,0.0,2.0", "1,Cream,2024-05-02,3.0,1.0,5.0"]
+
+    # a bad row rolls back the whole import
+    history.write_text("ProductID,Date,Remaining,Discarded,Produced\n1,2024-05-03,1,0,4\n2,2024-05-03,x,0,2\n")
+    with pytest.raises(ValueError, match="line 3"):
+        import_production_data(conn_string, str(history))
+    assert export_production_data(conn_string, str(exported))[0] == 3
+
+    # so does a date that isn't an ISO date
+    for bad_date in ("05/03/2024", "2024-5-3"):
+        history.write_text(f"ProductID,Date,Remaining,Discarded,Produced\n1,2024-05-03,1,0,4\n1,{bad_date},1,0,4\n")
+        with pytest.raises(ValueError, match="line 3"):
+            import_production_data(conn_string, str(history))
+    assert export_production_data(conn_string, str(exported))[0] == 3
+
+
+def test_generate_scenario(tmp_path):
+    end_date = date(2024, 5, 31)
+    rows = generate_scenario(str(tmp_path / "a"), 5, 20, 2, 7, end_date, package_sizes=(6,), workers=1)
+    assert list(rows.values()) == [100, 100]
+
+    # the same seed gives the same data and every store shares the catalog
+    generate_scenario(str(tmp_path / "b"), 5, 20, 2, 7, end_date, package_sizes=(6,), workers=1)
+    first, second, again = (get_connection(str(tmp_path / path)) for path in ("a/store_1.db", "a/store_2.db", "b/store_1.db"))
+    assert first.execute("SELECT * FROM ProductionData").fetchall() == again.execute("SELECT * FROM ProductionData").fetchall()
+    assert first.execute("SELECT * FROM ProductionData").fetchall() != second.execute("SELECT * FROM ProductionData").fetchall()
+    assert first.execute("SELECT * FROM Products").fetchall() == second.execute("SELECT * FROM Products").fetchall()
+    assert get_all_products(str(tmp_path / "a/store_1.db"))[0][3] == 6
+    assert len(get_data_for_new_list(str(tmp_path / "a/store_1.db"), 7)) == 5
+
+
+def test_benchmarks(tmp_path):
+    results = run_benchmarks(str(tmp_path), ((5, 10),), repeats=1)
+    assert set(results["scales"]["5x10"]) == {
+        "get_data_for_new_list_7", "get_data_for_new_list_30", "get_average_usage_by_product_30",
+        "get_old_list", "history_memory_mb", "insert_production_data", "calculations"}
+    assert find_regressions(results, results) == []
+    memory = results["scales"]["5x10"]["history_memory_mb"]
+    assert memory["streamed"] <= memory["fetchall"]
+
+    baseline = {"scales": {"5x10": {"slow": {"cold": 0.1, "warm": 0.1}}}}
+    results = {"scales": {"5x10": {"slow": {"cold": 0.12, "warm": 0.2}}, "1x1": {"slow": {"warm": 1}}}}
+    assert find_regressions(results, baseline) == [("5x10", "slow", "warm", 0.1, 0.2)]
+
+
+def test_gui_benchmarks():
+    pytest.importorskip("PyQt6")
+    results = run_gui_benchmarks((10,))
+    assert set(results["scales"]["10"]) == {"new_list", "old_list", "catalog"}
+    for measurements in results["scales"]["10"].values():
+        assert {"construct", "first_paint", "bulk_update"} <= set(measurements)
+
+
+def test_cli_does_not_import_qt():
+    result = subprocess.run([sys.executable, "-c", "import sys, cli; print('PyQt6' in sys.modules, 'shards' in sys.modules)"],
+                            capture_output=True, text=True, cwd=sys.path[0])
+    assert result.stdout.strip() == "False False"
+
+
+def test_core_import_budget():
+    # the core must stay importable without loading the GUI or numpy, and quickly
+    result = subprocess.run([sys.executable, "-c", """
+import sys, time
+start = time.perf_counter()
+import project
+print(time.perf_counter() - start)
+print(sorted(name for name in ("PyQt6", "numpy") if name in sys.modules))
+"""], capture_output=True, text=True, cwd=sys.path[0])
+    import_time, heavy_modules = result.stdout.splitlines()
+    assert heavy_modules == "[]"
+    assert float(import_time) < IMPORT_BUDGET
+
+
+def test_get_chain_usage(tmp_path):
+    for store, history in (("a", [(1, "2024-05-01", 1, 0, 3), (1, "2024-05-02", 2, 1, 4)]),
+                           ("b", [(1, "2024-05-01", 0, 0, 6)])):
+        (tmp_path / store).mkdir()
+        conn_string = create_test_database(tmp_path / store)
+        insert_product(conn_string, ("Cream", "Bottle", 5, False, ""))
+        insert_production_data(conn_string, history)
+        (tmp_path / store / "test_database.db").rename(tmp_path / f"{store}.db")
+
+    store_usage, chain_usage = get_chain_usage(str(tmp_path), 7, workers=2)
+    assert store_usage[str(tmp_path / "a.db")] == [(1, "Cream", 4.5, 5)]
+    assert store_usage[str(tmp_path / "b.db")] == [(1, "Cream", 6, 10)]
+    # the partial sums of both stores are merged before averaging
+    assert chain_usage == [("Cream", 2, 3, 5, 10.5)]
 
+    # a report doesn't upgrade a store that hasn't been migrated
+    sqlite3.connect(tmp_path / "c.db").close()
+    with pytest.raises(Exception, match="store not migrated"):
+        get_chain_usage(str(tmp_path), 7, workers=1)
+    with sqlite3.connect(tmp_path / "c.db") as conn:
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0
@@ -0,0 +1,219 @@
+import json
+import threading
+import time
+from collections import deque
+from functools import wraps
+from connection import get_connection
+
+# Seconds after which a call counts as a slow query
+SLOW_QUERY_THRESHOLD = 0.1
+# Statements kept per traced call, executemany runs one statement per row
+MAX_STATEMENTS = 20
+# Characters of the parameters kept per traced call
+MAX_PARAMETERS_LENGTH = 200
+# Number of slow calls kept for inspection
+MAX_SLOW_QUERIES = 100
+
+
+class QueryTracer():
+    """
+    Records the SQL statements, parameters, row counts and wall time of DB OPS calls.
+    Keeps per-function statistics in memory and can append every call to a JSON-lines file.
+    While disabled, traced functions only pay for checking the enabled flag
+    """
+    def __init__(self) -> None:
+        self.enabled = False
+        self.slow_threshold = SLOW_QUERY_THRESHOLD
+        self.trace_file = None
+        self.stats = {}
+        self.slow_queries = deque(maxlen=MAX_SLOW_QUERIES)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+
+    def enable(self, trace_path: str = None, slow_threshold: float = SLOW_QUERY_THRESHOLD) -> None:
+        """
+        Starts tracing, appending every call to the trace file if one is given
+        """
+        self.disable()
+        with self.lock:
+            self.slow_threshold = slow_threshold
+            if trace_path is not None:
+                self.trace_file = open(trace_path, "a")
+            self.enabled = True
+
+
+    def disable(self) -> None:
+        """
+        Stops tracing and closes the trace file, the statistics are kept
+        """
+        with self.lock:
+            self.enabled = False
+            if self.trace_file is not None:
+                self.trace_file.close()
+                self.trace_file = None
+
+
+    def reset(self) -> None:
+        """
+        Drops the collected statistics and slow queries
+        """
+        with self.lock:
+            self.stats.clear()
+            self.slow_queries.clear()
+
+
+    def on_statement(self, sql: str) -> None:
+        """
+        Trace callback of the connection, adds the statement to every traced call running on the thread
+        """
+        for statements in self.local.stack:
+            statements[1] += 1
+            if len(statements[0]) < MAX_STATEMENTS:
+                statements[0].append(sql)
+
+
+    def call(self, function, conn_string: str, args: tuple) -> object:
+        """
+        Runs a DB OPS function and records the statements it executed, the number of rows it
+        returned or changed and how long it took. Calls can be nested, i.e. one read function using another
+        """
+        conn = get_connection(conn_string)
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        if not stack:
+            conn.set_trace_callback(self.on_statement)
+        statements = [[], 0]
+        stack.append(statements)
+        changes = conn.total_changes
+        error = None
+        start = time.perf_counter()
+
+        try:
+            result = function(conn_string, *args)
+            return result
+        except Exception as exception:
+            result = None
+            error = exception
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+            if not stack:
+                conn.set_trace_callback(None)
+            rows = conn.total_changes - changes if result is None else count_rows(result)
+            self.record({
+                "function": function.__name__,
+                "database": conn_string,
+                "parameters": repr(args)[:MAX_PARAMETERS_LENGTH],
+                "statements": statements[0],
+                "statement_count": statements[1],
+                "rows": rows,
+                "seconds": seconds,
+                "slow": seconds >= self.slow_threshold,
+                "error": None if error is None else f"{type(error).__name__}: {error}",
+                "time": time.time(),
+            })
+
+
+    def record(self, entry: dict) -> None:
+        """
+        Adds a traced call to the statistics and the trace file
+        """
+        with self.lock:
+            stats = self.stats.setdefault(entry["function"], {
+                "calls": 0, "rows": 0, "seconds": 0.0, "max_seconds": 0.0, "slow": 0, "errors": 0,
+            })
+            stats["calls"] += 1
+            stats["rows"] += entry["rows"]
+            stats["seconds"] += entry["seconds"]
+            stats["max_seconds"] = max(stats["max_seconds"], entry["seconds"])
+            stats["slow"] += entry["slow"]
+            stats["errors"] += entry["error"] is not None
+            if entry["slow"]:
+                self.slow_queries.append(entry)
+            if self.trace_file is not None:
+                self.trace_file.write(json.dumps(entry) + "\n")
+                self.trace_file.flush()
+
+
+    def stats_table(self) -> list:
+        """
+        Returns a tuple of (function, calls, rows, total seconds, mean seconds, max seconds, slow calls, errors)
+        for every traced function, the most time consuming first
+        """
+        with self.lock:
+            table = [(name, s["calls"], s["rows"], s["seconds"], s["seconds"] / s["calls"],
+                      s["max_seconds"], s["slow"], s["errors"]) for name, s in self.stats.items()]
+        return sorted(table, key=lambda row: row[3], reverse=True)
+
+
+def count_rows(result: object) -> int:
+    """
+    Returns the number of rows a read function returned: the length of a list or dictionary,
+    the length of the first column of a tuple of columns, and one for a single value
+    """
+    if isinstance(result, (str, bytes)):
+        return 1
+    if isinstance(result, tuple):
+        return len(result[0]) if result and hasattr(result[0], "__len__") else 1
+    return len(result) if hasattr(result, "__len__") else 1
+
+
+QUERY_TRACER = QueryTracer()
+
+
+def traced_query(function):
+    """
+    Traces a DB OPS function taking a connection string followed by its other arguments
+    """
+    @wraps(function)
+    def wrapper(conn_string: str, *args) -> object:
+        if not QUERY_TRACER.enabled:
+            return function(conn_string, *args)
+        return QUERY_TRACER.call(function, conn_string, args)
+    return wrapper
+
+
+def enable_tracing(trace_path: str = None, slow_threshold: float = SLOW_QUERY_THRESHOLD) -> None:
+    """
+    Starts tracing the DB OPS, optionally appending every call to a JSON-lines file
+    """
+    QUERY_TRACER.enable(trace_path, slow_threshold)
+
+
+def disable_tracing() -> None:
+    """
+    Stops tracing the DB OPS
+    """
+    QUERY_TRACER.disable()
+
+
+def get_query_stats() -> list:
+    """
+    Returns the statistics of every traced function, the most time consuming first
+    """
+    return QUERY_TRACER.stats_table()
+
+
+def get_slow_queries() -> list:
+    """
+    Returns the latest calls that took longer than the slow-query threshold
+    """
+    with QUERY_TRACER.lock:
+        return list(QUERY_TRACER.slow_queries)
+
+
+def format_query_stats() -> str:
+    """
+    Returns the statistics of every traced function as a table, times in milliseconds
+    """
+    headers = ("Function", "Calls", "Rows", "Total ms", "Mean ms", "Max ms", "Slow", "Errors")
+    table = get_query_stats()
+    width = max([len(row[0]) for row in table] + [len(headers[0])])
+    lines = [f"{headers[0]:<{width}}  " + "  ".join(f"{header:>10}" for header in headers[1:])]
+    for name, calls, rows, seconds, mean_seconds, max_seconds, slow, errors in table:
+        lines.append(f"{name:<{width}}  {calls:>10}  {rows:>10}  {seconds * 1000:>10.2f}  "
+                     f"{mean_seconds * 1000:>10.2f}  {max_seconds * 1000:>10.2f}  {slow:>10}  {errors:>10}")
+    return "\n".join(lines)